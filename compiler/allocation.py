@@ -0,0 +1,195 @@
+"""
+Disposition des cadres de pile : réutilisation des cases des variables locales.
+
+L'analyse sémantique donne à chaque déclaration sa propre case, si bien qu'un
+cadre réserve une case par déclaration de la fonction, même quand deux blocs
+voisins ne vivent jamais en même temps. Cette passe calcule l'intervalle de
+vie de chaque variable dans l'ordre d'exécution (de sa déclaration à sa
+dernière utilisation, étendu à toute une boucle si la variable y sert et a
+été déclarée avant elle), puis colore les intervalles : deux variables dont
+les intervalles sont disjoints partagent une case.
+
+Les tableaux et les variables dont l'adresse est prise (&x) ne bougent pas
+et ne partagent pas leurs cases : un pointeur peut les lire à tout moment.
+Les paramètres restent aux adresses 0..n-1 fixées par l'appel.
+"""
+import heapq
+
+from analyse_syntaxique import (
+    ND_FUNC_DECL, ND_PROGRAM, ND_BLOCK, ND_IDENT, ND_ADDRESS_OF,
+    ND_DECL, ND_PTR_DECL, ND_ARRAY_DECL, ND_SWITCH,
+    ND_WHILE, ND_DOWHILE, ND_FOR,
+)
+
+# Nœuds qui introduisent une case (le switch garde sa valeur dans une case cachée)
+DECLARATIONS = (ND_DECL, ND_PTR_DECL, ND_ARRAY_DECL, ND_SWITCH)
+LOOPS = (ND_WHILE, ND_DOWHILE, ND_FOR)
+
+# Marqueurs du parcours : entrée dans la partie répétée d'une boucle, sortie
+_LOOP_START = object()
+_LOOP_END = object()
+
+
+def layout_frames(ast):
+    """Dispose les cadres de ast, renvoie {cadre: (cases avant, cases après)}"""
+    report = {}
+    for name, owner, items, base, size in frames(ast):
+        after = layout_frame(items, base, size)
+        resize_frame(owner, base, after)
+        before_total, after_total = report.get(name, (0, 0))
+        report[name] = (before_total + size, after_total + after)
+    return report
+
+
+def frames(ast, include=()):
+    """[(nom, nœud qui le réserve, instructions, base, taille)] des cadres de ast
+
+    Les cadres sont les fonctions (sauf celles reprises du cache, à moins
+    que leur nom soit dans include), le cadre des instructions de premier
+    niveau et, sans ND_PROGRAM, les blocs racines (ces deux derniers nommés
+    "start"). base est la première case après les paramètres.
+    """
+    if ast.type == ND_PROGRAM:
+        result = [("start", ast, [child for child in ast.enfant if child.type != ND_FUNC_DECL],
+                   0, ast.total_declarations)]
+        for function in ast.enfant:
+            if function.type == ND_FUNC_DECL and (function.cached_code is None
+                                                   or function.chaine in include):
+                params = sum(1 for child in function.enfant if child.is_parameter)
+                result.append((function.chaine, function, [function.enfant[-1]],
+                               params, params + function.local_count))
+        return result
+
+    result = []
+    stack = [ast]
+    while stack:
+        node = stack.pop()
+        if node.type == ND_BLOCK and node.is_root:
+            result.append(("start", node, [node], 0, node.total_declarations))
+        else:
+            stack.extend(node.enfant)
+    return result
+
+
+def resize_frame(owner, base, size):
+    """Donne la taille size au cadre réservé par owner"""
+    if owner.type == ND_FUNC_DECL:
+        owner.local_count = size - base
+    else:
+        owner.total_declarations = size
+
+
+def layout_frame(items, base, size):
+    """Réaffecte les cases base..size-1 utilisées par items, renvoie la taille du cadre
+
+    Le cadre est laissé tel quel si une variable est utilisée sans que sa
+    déclaration soit dans items (déclaration retirée comme code mort).
+    """
+    variables = {}   # {adresse: [début, fin, largeur]}
+    pinned = set()   # adresses des tableaux et des variables dont on prend l'adresse
+    nodes = {}       # {id: nœud portant une adresse du cadre}
+    loops = []       # [(début, adresses utilisées)] des boucles englobantes
+    position = 0
+
+    stack = list(reversed(items))
+    while stack:
+        node = stack.pop()
+        if node is _LOOP_START:
+            loops.append((position, set()))
+            continue
+        if node is _LOOP_END:
+            start, used = loops.pop()
+            for address in used:
+                variable = variables[address]
+                if variable[0] < start:   # déclarée avant : vivante pendant toute la boucle
+                    variable[1] = position
+            if loops:
+                loops[-1][1].update(used)
+            continue
+
+        position += 1
+        kind = node.type
+        if kind == ND_FUNC_DECL:   # son propre cadre
+            continue
+        address = node.address
+        if address is not None and address >= base:
+            nodes[id(node)] = node
+            if kind in DECLARATIONS:
+                width = node.array_size if kind == ND_ARRAY_DECL else 1
+                variables[address] = [position, position, width]
+                if kind == ND_ARRAY_DECL:
+                    pinned.add(address)
+            else:
+                variable = variables.get(address)
+                if variable is None:
+                    return size
+                variable[1] = position
+                if loops:
+                    loops[-1][1].add(address)
+        if kind == ND_ADDRESS_OF and node.enfant[0].type == ND_IDENT:
+            pinned.add(node.enfant[0].address)
+
+        if kind in LOOPS:
+            stack.append(_LOOP_END)
+            if kind == ND_FOR:
+                # exécuté dans l'ordre init, puis (condition, corps, incrément)*
+                init, condition, increment, body = node.enfant
+                stack.extend((increment, body, condition, _LOOP_START, init))
+                continue
+            stack.extend(reversed(node.enfant))
+            stack.append(_LOOP_START)
+        else:
+            stack.extend(reversed(node.enfant))
+
+    # Les cases réservées gardent leur adresse (un pointeur peut l'avoir
+    # conservée), les autres variables se répartissent dans les trous puis
+    # au-dessus, par balayage des intervalles
+    slots = {}
+    top = base
+    for address in pinned & variables.keys():
+        slots[address] = address
+        top = max(top, address + variables[address][2])
+    taken = {address + i for address in slots for i in range(variables[address][2])}
+    free = [slot for slot in range(base, top) if slot not in taken]   # cases libres, triées
+    active = []    # (fin, case) des intervalles en cours
+    for address, (start, end, _) in sorted(variables.items(), key=lambda item: item[1][0]):
+        if address in slots:
+            continue
+        while active and active[0][0] < start:
+            heapq.heappush(free, heapq.heappop(active)[1])
+        if free:
+            slot = heapq.heappop(free)
+        else:
+            slot = top
+            top += 1
+        slots[address] = slot
+        heapq.heappush(active, (end, slot))
+
+    for node in nodes.values():
+        node.address = slots[node.address]
+    return top
+
+
+if __name__ == "__main__":
+    from analyse_semantique import compile_code
+
+    source = """
+    int f(int n) {
+        int t[4];
+        int k;
+        int *p;
+        int total;
+        total = 0;
+        { int a; a = n * 2; total = total + a; }
+        { int b; b = n * 3; total = total + b; }
+        for (int i = 0; i < n; i = i + 1) { int c; c = i; total = total + c; }
+        p = &k;
+        *p = total;
+        t[0] = k;
+        return t[0];
+    }
+    int main() { debug f(4) + 48; return 0; }
+    """
+    for level in (0, 1):
+        result = compile_code(source, verbose=False, opt_level=level)
+        print(f"-O{level}:", result.stats.get("frames"))
@@ -1,9 +1,13 @@
+import hashlib
 import re
+import sys
+from array import array
 
 # --- Mots-clés ---
 
 KEYWORDS = {
    "int","debug","elif","int" ,"if", "else", "while", "return", "True", "False", "None","int", "default","breaks","continue","void","do","for", 
+   "switch", "case", "break",
 }
 # --- Spécification (les opérateurs à 2 chars AVANT ceux à 1 char) ---
 TOKEN_SPEC = [
@@ -111,10 +115,155 @@ class Lexer: #analyseur lexical
         """Vérifie si le token courant est du type attendu."""
         return self.current and self.current[0] == expected_type
 
+
+# --- Tokenisation en bloc ---
+
+# Codes entiers des types de tokens
+TOKEN_KINDS = [name for name, _ in TOKEN_SPEC] + ["tok_motscle", "tok_EOF"]
+KIND_CODE = {name: code for code, name in enumerate(TOKEN_KINDS)}
+
+TOK_NEWLINE = KIND_CODE["tok_NEWLINE"]
+TOK_MISMATCH = KIND_CODE["tok_MISMATCH"]
+TOK_IDENTIFIANT = KIND_CODE["tok_identifiant"]
+TOK_CHIFFRE = KIND_CODE["tok_chiffre"]
+TOK_MOTSCLE = KIND_CODE["tok_motscle"]
+TOK_EOF = KIND_CODE["tok_EOF"]
+
+# Même spécification, les espaces étant absorbés devant chaque token ;
+# le groupe numéro i+1 correspond au i-ème type de BULK_KINDS
+_BULK_SPEC = [(n, p) for n, p in TOKEN_SPEC if n != "tok_espace"]
+BULK_RE = re.compile("[ \\t]*(?:" + "|".join(f"({p})" for _, p in _BULK_SPEC) + ")")
+BULK_KINDS = [None] + [KIND_CODE[n] for n, _ in _BULK_SPEC]
+
+
+class TokenArray:
+    """Tokens d'un source rangés en colonnes parallèles
+
+      - kinds  : code entier du type (voir TOKEN_KINDS)
+      - starts : position du token dans le texte
+      - lines  : numéro de ligne
+      - values : valeur (int pour les nombres, chaîne internée sinon)
+    La dernière entrée est toujours tok_EOF.
+    """
+    def __init__(self):
+        self.kinds = array('B')
+        self.starts = array('l')
+        self.lines = array('l')
+        self.values = []
+
+    def __len__(self):
+        return len(self.kinds)
+
+
+def tokenize(text):
+    """Découpe tout le texte en une passe, renvoie un TokenArray"""
+    tokens = TokenArray()
+    add_kind = tokens.kinds.append
+    add_start = tokens.starts.append
+    add_line = tokens.lines.append
+    add_value = tokens.values.append
+    intern = sys.intern
+    line = 1
+    # des espaces en fin de texte ne précèdent aucun token
+    for m in BULK_RE.finditer(text.rstrip(" \t")):
+        group = m.lastindex
+        kind = BULK_KINDS[group]
+        if kind == TOK_NEWLINE:
+            line += 1
+            continue
+        lex = m.group(group)
+        if kind == TOK_IDENTIFIANT:
+            if lex in KEYWORDS:
+                kind = TOK_MOTSCLE
+            value = intern(lex)
+        elif kind == TOK_CHIFFRE:
+            value = int(lex)
+        elif kind == TOK_MISMATCH:
+            raise SyntaxError(f"Caractère inattendu {lex!r} à la ligne {line}")
+        else:
+            value = intern(lex)
+        add_kind(kind)
+        add_start(m.start(group))
+        add_line(line)
+        add_value(value)
+    add_kind(TOK_EOF)
+    add_start(len(text))
+    add_line(line)
+    add_value(None)
+    return tokens
+
+
+class BulkLexer:
+    """
+    Même interface que Lexer, sur un TokenArray produit en une seule passe :
+      - peek(), next(), check(t) comme Lexer
+      - peek_at(k)  : k-ième token après le courant, sans avancer
+      - pos         : indice du token courant dans les colonnes
+    """
+    def __init__(self, text: str):
+        self.text = text
+        self.tokens = tokenize(text)
+        self.kinds = self.tokens.kinds
+        self.values = self.tokens.values
+        self.last = len(self.kinds) - 1   # indice du tok_EOF
+        self.pos = 0
+
+    @property
+    def line(self):
+        return self.tokens.lines[self.pos]
+
+    @property
+    def current(self):
+        return (TOKEN_KINDS[self.kinds[self.pos]], self.values[self.pos])
+
+    def peek(self):
+        """Token courant sans avancer."""
+        return (TOKEN_KINDS[self.kinds[self.pos]], self.values[self.pos])
+
+    def peek_at(self, offset):
+        """Token à offset positions du courant (tok_EOF au-delà de la fin)."""
+        pos = min(self.pos + offset, self.last)
+        return (TOKEN_KINDS[self.kinds[pos]], self.values[pos])
+
+    def next(self):
+        """Avance d'un token et retourne le nouveau courant."""
+        if self.pos < self.last:
+            self.pos += 1
+        return self.peek()
+
+    def check(self, expected_type: str) -> bool:
+        """Vérifie si le token courant est du type attendu."""
+        return self.kinds[self.pos] == KIND_CODE[expected_type]
+
+    def mark(self):
+        """Position du token courant"""
+        return self.pos
+
+    def fingerprint(self, start, end):
+        """Hash des tokens entre deux positions de mark()"""
+        h = hashlib.sha256(self.kinds[start:end].tobytes())
+        h.update(repr(self.values[start:end]).encode())
+        return h.hexdigest()
+
+
 if __name__ == "__main__":
     code = "def f(x){ a = 12 + 3*5; if(a==27) return True; }"
     lx = Lexer(code)
     print("Premier token :", lx.peek())          
     while not lx.check("tok_EOF"):
         print(lx.peek())                         
-        lx.next()                                
\ No newline at end of file
+        lx.next()                                
+
+    # Comparaison Lexer / tokenize sur un gros source
+    import time
+    big = "int f(int x) {\n    int a;\n    a = 12 + 3*x;\n    if (a >= 27) return a;\n    return 0;\n}\n" * 20000
+    t0 = time.perf_counter()
+    lx = Lexer(big)
+    n = 0
+    while not lx.check("tok_EOF"):
+        lx.next()
+        n += 1
+    t1 = time.perf_counter()
+    tokens = tokenize(big)
+    t2 = time.perf_counter()
+    print(f"{len(big) // 1024} KB, {n} tokens: Lexer {t1 - t0:.3f}s, tokenize {t2 - t1:.3f}s")
\ No newline at end of file
@@ -0,0 +1,257 @@
+"""
+Analyse statique de la pile : profondeur maximale et taille des cadres.
+
+Chaque instruction a un effet connu sur la hauteur de la pile (msm/msm.txt).
+En suivant les blocs de base de chaque fonction depuis son entrée, on obtient
+la hauteur avant chaque instruction, relative à l'entrée de la fonction (les
+paramètres déjà empilés n'y comptent pas) :
+
+    prep f          +2 (adresse de retour, ancien bp)
+    call n          la fonction appelée part de la hauteur courante et monte
+                    de son propre pic ; au retour, -(n + 1)
+    resn n / drop n +n / -n
+    ret, halt       fin du chemin
+
+Le pic d'une fonction comprend celui des fonctions qu'elle appelle, pris
+dans l'ordre du graphe d'appel. Une fonction récursive (ou qui en appelle
+une) n'a pas de borne : son pic vaut None. Les appels terminaux sur
+soi-même sont devenus des sauts et ne comptent pas.
+
+msm.c range le code en bas de la mémoire (mem[0..]) et la pile en haut.
+read/write indexent mem[adresse] depuis 0 : les adresses absolues (au plus
+la taille du plus grand cadre) recouvrent donc le code au lieu de
+s'ajouter à lui. Sous la pile, il faut la plus grande des deux zones,
+d'où max(code, cadre) + pile dans StackReport.memory, et non une somme.
+"""
+from cfg import build_cfg
+from emetteur import (
+    OP_DROP, OP_DUP, OP_SWAP, OP_PUSH, OP_GET, OP_SET, OP_READ, OP_WRITE,
+    OP_ADD, OP_SUB, OP_MUL, OP_DIV, OP_MOD, OP_NOT, OP_AND, OP_OR,
+    OP_CMPEQ, OP_CMPNE, OP_CMPLT, OP_CMPLE, OP_CMPGT, OP_CMPGE,
+    OP_JUMPT, OP_JUMPF, OP_PREP, OP_CALL, OP_RESN,
+    OP_SEND, OP_RECV, OP_DBG, OP_LABEL,
+)
+
+# Cases empilées moins cases dépilées, pour les instructions à effet fixe
+STACK_EFFECTS = {
+    OP_DUP: 1, OP_SWAP: 0, OP_PUSH: 1, OP_GET: 1, OP_SET: -1,
+    OP_READ: 0, OP_WRITE: -2,
+    OP_ADD: -1, OP_SUB: -1, OP_MUL: -1, OP_DIV: -1, OP_MOD: -1,
+    OP_NOT: 0, OP_AND: -1, OP_OR: -1,
+    OP_CMPEQ: -1, OP_CMPNE: -1, OP_CMPLT: -1, OP_CMPLE: -1, OP_CMPGT: -1, OP_CMPGE: -1,
+    OP_PREP: 2, OP_SEND: -1, OP_RECV: 1, OP_DBG: -1,
+}
+
+
+class StackUsage:
+    """
+    Pile d'une fonction (ou de start) :
+      - params   : paramètres (opérande des call qui l'appellent)
+      - locals   : cases réservées par resn
+      - operands : hauteur maximale des valeurs de calcul, sans les appels
+      - peak     : hauteur maximale au-dessus de l'entrée, appels compris
+                   (None : récursion, pas de borne)
+    """
+    def __init__(self, name):
+        self.name = name
+        self.params = 0
+        self.locals = 0
+        self.operands = 0
+        self.peak = 0
+
+    @property
+    def frame(self):
+        """Cases du cadre : paramètres et variables locales"""
+        return self.params + self.locals
+
+
+class StackReport:
+    """Résultat de analyze_stack : usage par fonction et besoins du programme"""
+    def __init__(self, functions, code_words):
+        self.functions = functions     # {nom: StackUsage}, start en premier
+        self.code_words = code_words   # cases occupées par le code dans msm.c
+
+    @property
+    def peak(self):
+        """Cases de pile au plus pendant l'exécution, None si pas de borne"""
+        start = self.functions.get("start")
+        return start.peak if start is not None else 0
+
+    @property
+    def memory(self):
+        """Cases de mémoire suffisantes pour exécuter le programme, ou None"""
+        if self.peak is None:
+            return None
+        data = max((usage.frame for usage in self.functions.values()), default=0)
+        return max(self.code_words, data) + self.peak
+
+    def header(self):
+        """Métadonnées écrites en tête du programme (voir emetteur.format_header)"""
+        if self.peak is None:
+            return {"stack": "unbounded", "memory": "unbounded"}
+        return {"stack": self.peak, "memory": self.memory}
+
+
+def analyze_stack(code):
+    """Profondeur de pile de chaque fonction et du programme, renvoie un StackReport
+
+    Lève ValueError si deux chemins arrivent à une même instruction avec
+    des hauteurs différentes (code mal formé).
+    """
+    graph = build_cfg(code)
+    roots = {block.names[0]: block for block in graph.roots}
+    functions = {}
+    calls = {}   # {fonction: {fonctions appelées}}
+    params = {}  # {fonction: nombre d'arguments de ses appels}
+    for name, root in roots.items():
+        if name != "end":
+            functions[name] = StackUsage(name)
+            calls[name] = _callees(root)
+
+    recursive = set()
+    for name in _call_order(calls, recursive):
+        _analyze_function(roots[name], functions[name], functions, params)
+
+    # Sans borne : les fonctions récursives et toutes celles qui les appellent
+    callers = {}
+    for name, called in calls.items():
+        for callee in called:
+            callers.setdefault(callee, []).append(name)
+    unbounded = [name for name, usage in functions.items() if usage.peak is None or name in recursive]
+    while unbounded:
+        name = unbounded.pop()
+        functions[name].peak = None
+        unbounded.extend(caller for caller in callers.get(name, ()) if functions[caller].peak is not None)
+    for name, count in params.items():
+        if name in functions:
+            functions[name].params = count
+
+    # Comme msm.c : la taille du code en mem[0], puis un mot par opcode et par opérande
+    code_words = 1 + len(code)
+    for op, arg in code:
+        if op == OP_LABEL:
+            code_words -= 1
+        elif arg is not None:
+            code_words += 1
+    return StackReport(functions, code_words)
+
+
+def format_stack(report):
+    """Tableau de l'usage de la pile de chaque fonction d'un StackReport"""
+    def cells(value):
+        return "unbounded" if value is None else value
+    lines = [f"Stack: {cells(report.peak)} cells at most, memory: {cells(report.memory)} cells",
+             f"  {'function':<14} {'params':>6} {'locals':>6} {'operands':>8} {'peak':>9}"]
+    for usage in report.functions.values():
+        lines.append(f"  {usage.name:<14} {usage.params:>6} {usage.locals:>6} "
+                     f"{usage.operands:>8} {cells(usage.peak):>9}")
+    return "\n".join(lines)
+
+
+def _reachable(root):
+    """Blocs d'une fonction, depuis son entrée"""
+    seen = {root}
+    stack = [root]
+    while stack:
+        for successor in stack.pop().successors():
+            if successor not in seen:
+                seen.add(successor)
+                stack.append(successor)
+    return seen
+
+
+def _callees(root):
+    """Noms des fonctions préparées (prep) dans une fonction"""
+    return {arg for block in _reachable(root) for op, arg in block.code if op == OP_PREP}
+
+
+def _call_order(calls, recursive):
+    """Fonctions dans l'ordre où les appelées précèdent leurs appelants
+
+    Les fonctions qui font partie d'un cycle d'appels sont ajoutées à
+    recursive.
+    """
+    order = []
+    state = {}   # 1 : en cours de visite, 2 : terminée
+    for first in calls:
+        if first in state:
+            continue
+        path = [first]
+        pending = [iter(sorted(calls[first] & calls.keys()))]
+        state[first] = 1
+        while pending:
+            callee = next(pending[-1], None)
+            if callee is None:
+                pending.pop()
+                done = path.pop()
+                state[done] = 2
+                order.append(done)
+            elif callee not in state:
+                state[callee] = 1
+                path.append(callee)
+                pending.append(iter(sorted(calls[callee] & calls.keys())))
+            elif state[callee] == 1:   # cycle : tout le chemin depuis callee
+                recursive.update(path[path.index(callee):])
+    return order
+
+
+def _analyze_function(root, usage, functions, params):
+    """Hauteurs dans une fonction, depuis 0 à son entrée ; remplit usage"""
+    entry = {root: (0, ())}   # {bloc: (hauteur, prep en attente)}
+    work = [root]
+    high = 0      # hauteur maximale sans les appels
+    calls = 0     # hauteur maximale pendant les appels, None sans borne
+    while work:
+        block = work.pop()
+        depth, preps = entry[block]
+        for op, arg in block.code:
+            if op == OP_RESN:
+                depth += arg
+                usage.locals += arg
+            elif op == OP_DROP:
+                depth -= arg
+            elif op == OP_PREP:
+                depth += 2
+                preps += (arg,)
+            elif op == OP_CALL:
+                name = preps[-1]
+                preps = preps[:-1]
+                if params.get(name, 0) < arg:
+                    params[name] = arg
+                callee = functions.get(name)
+                if callee is None or callee.peak is None:
+                    calls = None
+                elif calls is not None and depth + callee.peak > calls:
+                    calls = depth + callee.peak
+                depth -= arg + 1
+                continue
+            else:
+                depth += STACK_EFFECTS[op]
+            if depth > high:
+                high = depth
+        if block.exit in (OP_JUMPT, OP_JUMPF):
+            depth -= 1
+        for successor in block.successors():
+            state = (depth, preps)
+            known = entry.get(successor)
+            if known is None:
+                entry[successor] = state
+                work.append(successor)
+            elif known != state:
+                raise ValueError(f"Inconsistent stack depth at {successor!r} in {usage.name}")
+    usage.operands = high - usage.locals
+    usage.peak = None if calls is None else max(high, calls)
+
+if __name__ == "__main__":
+    from analyse_semantique import compile_code
+
+    somme = """
+    int carre(int x) { return x * x; }
+    int somme(int n) { int s; s = 0; for (int i = 0; i < n; i = i + 1) s = s + carre(i); return s; }
+    int main() { debug somme(4); return 0; }
+    """
+    fact = "int fact(int n) { if (n < 2) return 1; return n * fact(n - 1); } int main() { debug fact(5); return 0; }"
+    for source in (somme, fact):
+        result = compile_code(source, verbose=False, inline_budget=0)
+        print(result.header)
+        print(format_stack(result.stats["stack"]))
@@ -1,10 +1,30 @@
+import sys
+
+from analyse_lexique import BulkLexer
 from analyse_syntaxique import (
-    Nd, parse,
-    ND_CONST, ND_NOT, ND_NEG, ND_ADD, ND_SUB, ND_MUL, ND_DIV,
-    ND_LT, ND_GT, ND_LE, ND_GE, ND_EQ, ND_NE,
-    ND_IDENT, ND_DECL, ND_ASSIGN, ND_IF, ND_WHILE, ND_DEBUG, ND_BLOCK, ND_DROP,
-    ND_ARRAY_DECL, ND_ARRAY_ACCESS, ND_ARRAY_ASSIGN, ND_DOWHILE,ND_FOR,
-    ND_PTR_DECL, ND_ADDRESS_OF, ND_DEREF, ND_DEREF_ASSIGN
+    Parser,
+    ND_CONST, ND_NOT, ND_AND, ND_OR, ND_IDENT, ND_DECL, ND_ARRAY_DECL, ND_ARRAY_ACCESS,
+    ND_PTR_DECL, ND_FUNC_DECL, ND_FUNC_CALL, ND_RETURN, ND_PROGRAM,
+    ND_SWITCH, ND_CASE, ND_DEFAULT,
+    NODE_NAMES,
+)
+import peephole
+from parcours import Visitor
+from instrumentation import Instrumentation
+from optimisation import (
+    fold_constants, eliminate_dead_code, hoist_invariants, constant_value,
+    inline_calls, INLINE_BUDGET,
+)
+from allocation import layout_frames
+from cfg import build_cfg, run_passes, linearize
+from analyse_pile import analyze_stack
+from emetteur import (
+    Emitter, format_instructions, format_header, parse_header, label_table, parse_instructions,
+    object_header,
+    OP_LABEL, OP_DROP, OP_DUP, OP_PUSH, OP_GET, OP_SET, OP_READ, OP_WRITE,
+    OP_ADD, OP_SUB, OP_MUL, OP_DIV, OP_NOT,
+    OP_CMPEQ, OP_CMPNE, OP_CMPLT, OP_CMPLE, OP_CMPGT, OP_CMPGE,
+    OP_JUMP, OP_JUMPT, OP_JUMPF, OP_PREP, OP_CALL, OP_RET, OP_RESN, OP_SEND, OP_HALT,
 )
 
 
@@ -58,6 +78,22 @@ class SymbolTable:
 
         return address
     
+    def enter_function(self):
+        """Start a new frame: addresses restart at 0 and outer names are hidden
+
+        Returns the saved state to give back to leave_function.
+        """
+        saved = (self.scopes, self.next_address, self.array_info, self.pointer_info)
+        self.scopes = [{}]
+        self.next_address = 0
+        self.array_info = {}
+        self.pointer_info = {}
+        return saved
+
+    def leave_function(self, saved):
+        """Restore the state saved by enter_function"""
+        self.scopes, self.next_address, self.array_info, self.pointer_info = saved
+
     def is_array(self, address):
         """Check if an address is an array"""
         return address in self.array_info
@@ -76,31 +112,26 @@ class SymbolTable:
             if name in scope:
                 return scope[name]
         raise NameError(f"Variable '{name}' not declared")
-        
-# Label generation
-label_counter = 0
 
-def new_label():
-    global label_counter
-    label = f"L{label_counter}"
-    label_counter += 1
-    return label
 
+class SemanticAnalyzer(Visitor):
+    PREFIX = "analyze_"
 
-class SemanticAnalyzer:
     def __init__(self, symbol_table):
+        super().__init__()
         self.symbol_table = symbol_table
+        self.switch_count = 0   # names the hidden slot of each switch
+        self.breakable = 0      # enclosing loops and switches
+        self.address_operand = None   # operand of the & being analyzed
 
     def analyze(self, node):
         """Perform semantic analysis on the AST"""
-        method_name = f'analyze_{node.type}'
-        method = getattr(self, method_name, self.generic_analyze)
-        return method(node)
+        return self.visit(node)
 
-    def generic_analyze(self, node):
+    def default(self, node):
         """Default analysis for nodes with children"""
         for child in node.enfant:
-            self.analyze(child)
+            yield child
 
     def analyze_nd_const(self, node):
         """Constants need no analysis"""
@@ -111,26 +142,43 @@ class SemanticAnalyzer:
         node.address = self.symbol_table.lookup(node.chaine)
     
     def analyze_nd_func_decl(self, node):
+        # Each function has its own frame: parameters at 0..n-1, then locals
+        saved = self.symbol_table.enter_function()
+
         # Enter new scope for parameters
         self.symbol_table.enter_scope()
         
         # Only declare parameter nodes
         for child in node.enfant:
-            if hasattr(child, 'is_parameter') and child.is_parameter:
+            if child.is_parameter:
                 self.symbol_table.declare(child.chaine)
+        param_count = self.symbol_table.next_address
         
         # Analyze the function body (last child)
         if node.enfant:
-            self.analyze(node.enfant[-1])
+            yield node.enfant[-1]
     
         self.symbol_table.leave_scope()
+        node.local_count = self.symbol_table.next_address - param_count
+        self.symbol_table.leave_function(saved)
+
+    def analyze_nd_program(self, node):
+        """Analyze a translation unit: top-level statements share one frame"""
+        node.total_declarations = sum(self._count_all_declarations(child)
+                                      for child in node.enfant if child.type != ND_FUNC_DECL)
+        # Top-level blocks are not root blocks: the program reserves the frame.
+        # Functions reused from the cache are analyzed too: they may be inlined.
+        self.symbol_table.enter_scope()
+        for child in node.enfant:
+            yield child
+        self.symbol_table.leave_scope()
 
     def analyze_nd_func_call(self, node):
         for arg in node.enfant:
-            self.analyze(arg)
+            yield arg
 
     def analyze_nd_return(self, node):
-        self.analyze(node.enfant[0])
+        yield node.enfant[0]
 
     def analyze_nd_decl(self, node):
         """Declare variable and store its address"""
@@ -138,7 +186,7 @@ class SemanticAnalyzer:
 
     def analyze_nd_assign(self, node):
         """Analyze assignment"""
-        self.analyze(node.enfant[1])
+        yield node.enfant[1]
         ident_node = node.enfant[0]
         ident_node.address = self.symbol_table.lookup(ident_node.chaine)
 
@@ -157,7 +205,7 @@ class SemanticAnalyzer:
         node.direct_decl_count = sum(1 for child in node.enfant if child.type == ND_DECL)
         
         for child in node.enfant:
-            self.analyze(child)
+            yield child
         
         node.drop_count = self.symbol_table.leave_scope()
 
@@ -166,24 +214,36 @@ class SemanticAnalyzer:
         node.address = self.symbol_table.declare(node.chaine, node.array_size)
     
     def analyze_nd_array_access(self,node):
-        self.analyze(node.enfant[1])
+        yield node.enfant[1]
         ident_node=node.enfant[0]
         ident_node.address = self.symbol_table.lookup(ident_node.chaine)
 
         # Verify it's actually an array
         if not self.symbol_table.is_array(ident_node.address):
             raise TypeError(f"'{ident_node.chaine}' is not an array")
+        # &arr[size] is the valid address just past the end
+        self._check_index(ident_node, node.enfant[1], one_past=node is self.address_operand)
 
     def analyze_nd_array_assign(self, node):
         """Analyze array assignment"""
-        self.analyze(node.enfant[1])  # index
-        self.analyze(node.enfant[2])  # value
+        yield node.enfant[1]  # index
+        yield node.enfant[2]  # value
         
         ident_node = node.enfant[0]
         ident_node.address = self.symbol_table.lookup(ident_node.chaine)
         
         if not self.symbol_table.is_array(ident_node.address):
             raise TypeError(f"'{ident_node.chaine}' is not an array")
+        self._check_index(ident_node, node.enfant[1])
+
+    def _check_index(self, ident_node, index, one_past=False):
+        """Reject a constant index outside the declared size of the array"""
+        value = constant_value(index)
+        if value is None:
+            return
+        size = self.symbol_table.get_array_size(ident_node.address)
+        if not 0 <= value < size + one_past:
+            raise IndexError(f"Index {value} out of bounds for array '{ident_node.chaine}' of size {size}")
         
     def analyze_nd_ptr_decl(self, node):
         """Declare pointer and store its address"""
@@ -197,230 +257,497 @@ class SemanticAnalyzer:
         if operand.type not in [ND_IDENT, ND_ARRAY_ACCESS]:
             raise TypeError("Cannot take address of non-lvalue")
         
-        self.analyze(operand)
+        self.address_operand = operand
+        yield operand
     
     def analyze_nd_deref(self, node):
         """Analyze dereference operator"""
-        self.analyze(node.enfant[0])
+        yield node.enfant[0]
         
         # Optional: Check if dereferencing a pointer
         # This would require type tracking, which is more complex
     
     def analyze_nd_deref_assign(self, node):
         """Analyze pointer dereference assignment"""
-        self.analyze(node.enfant[0])  # pointer expression
-        self.analyze(node.enfant[1])  # value expression
+        yield node.enfant[0]  # pointer expression
+        yield node.enfant[1]  # value expression
     
+    def analyze_nd_while(self, node):
+        """Loops are targets for break"""
+        self.breakable += 1
+        for child in node.enfant:
+            yield child
+        self.breakable -= 1
+
+    analyze_nd_for = analyze_nd_dowhile = analyze_nd_while
+
+    def analyze_nd_switch(self, node):
+        """Check the case labels, keep the switch value in a hidden slot"""
+        expr, body = node.enfant
+        yield expr
+        # '.' cannot appear in an identifier, so no clash with the program's names
+        self.switch_count += 1
+        node.address = self.symbol_table.declare(f"switch.{self.switch_count}")
+
+        values = set()
+        has_default = False
+        for item in body.enfant:
+            if item.type == ND_CASE:
+                value, _ = fold_constants(item.enfant[0])
+                if value.type != ND_CONST:
+                    raise TypeError("case label is not a constant expression")
+                if value.valeur in values:
+                    raise ValueError(f"Duplicate case value {value.valeur} in switch")
+                values.add(value.valeur)
+                item.valeur = value.valeur
+                item.enfant = ()
+            elif item.type == ND_DEFAULT:
+                if has_default:
+                    raise ValueError("Multiple default labels in switch")
+                has_default = True
+
+        self.breakable += 1
+        yield body
+        self.breakable -= 1
+
+    def analyze_nd_break(self, node):
+        if not self.breakable:
+            raise SyntaxError("break outside of a loop or switch")
+
     def analyze_nd_for_decl(self, node):
         """Analyze for-loop declaration+initialization"""
         # Analyze declaration
-        self.analyze(node.enfant[0])  # ND_DECL
+        yield node.enfant[0]  # ND_DECL
         # Analyze assignment
-        self.analyze(node.enfant[1])  # ND_ASSIGN
+        yield node.enfant[1]  # ND_ASSIGN
     
     def _count_all_declarations(self, node):
-        """Count all declarations recursively"""
+        """Count all declarations in a subtree"""
         count = 0
-        if node.type == ND_DECL:
-            return 1
-        if node.type == ND_PTR_DECL:
-            return 1
-        if node.type == ND_ARRAY_DECL:  # NEW
-            return node.array_size
-        for child in node.enfant:
-            count += self._count_all_declarations(child)
-        
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            if node.type == ND_FUNC_DECL:  # has its own frame
+                continue
+            if node.type in (ND_DECL, ND_PTR_DECL):
+                count += 1
+            elif node.type == ND_ARRAY_DECL:
+                count += node.array_size
+            else:
+                if node.type == ND_SWITCH:  # hidden slot for the value
+                    count += 1
+                stack.extend(node.enfant)
         return count
 
 
-class CodeGenerator:
-    def __init__(self, symbol_table):
+def is_dense(cases):
+    """True when the sorted case values fill at least half of their range"""
+    span = cases[-1][0] - cases[0][0] + 1
+    return len(cases) >= 3 and span <= 2 * len(cases)
+
+
+def _known_target(cases, low, high, default):
+    """Label reached without any test from [low, high], or None"""
+    if not cases:
+        return default
+    if len(cases) == 1 and low == high == cases[0][0]:
+        return cases[0][1]
+    return None
+
+
+class CodeGenerator(Visitor):
+    PREFIX = "gen_"
+
+    def __init__(self, symbol_table, emitter=None, tail_calls=False, rotate_loops=False,
+                 call_main=True):
+        super().__init__()
         self.symbol_table = symbol_table
+        self.emitter = emitter if emitter is not None else Emitter()
+        self.tail_calls = tail_calls   # turn "return f(...)" in f into a jump
+        self.rotate_loops = rotate_loops   # test loop conditions at the bottom
+        self.call_main = call_main     # False in objects: the linker calls main
+        self.label_counter = 0     # labels outside functions
+        self.function = None       # function being generated
+        self.function_labels = 0   # labels created in that function
+        self.function_params = 0   # its parameter count
+        self.entry_label = None    # its entry label, target of its tail calls
+        self.function_code = {}    # {function name: its instructions}
+        self.break_labels = []     # end label of the enclosing loops/switches
+        self.inline_ends = []      # end label of the enclosing inlined calls
+        self.case_labels = {}      # {id(case/default marker): label}
+
+    def new_label(self):
+        """New label, namespaced by function so that its code can be reused"""
+        if self.function is None:
+            label = f"L{self.label_counter}"
+            self.label_counter += 1
+            return label
+        label = f"{self.function}.L{self.function_labels}"
+        self.function_labels += 1
+        return label
+
+    def emit(self, op, arg=None):
+        """Append one instruction to the emitter"""
+        self.emitter.emit(op, arg)
+
+    def label(self, name):
+        """Define a label at the current position"""
+        self.emitter.label(name)
 
     def generate(self, node):
         """Generate code for a node"""
-        method_name = f'gen_{node.type}'
-        method = getattr(self, method_name, None)
-        if method:
-            method(node)
-        else:
-            raise ValueError(f"Unknown node type: {node.type}")
+        self.visit(node)
 
     def gen_nd_const(self, node):
-        print("push", node.valeur)
+        self.emit(OP_PUSH, node.valeur)
 
     def gen_nd_not(self, node):
-        self.generate(node.enfant[0])
-        print("not")
+        yield node.enfant[0]
+        self.emit(OP_NOT)
 
     def gen_nd_neg(self, node):
-        self.generate(node.enfant[0])
-        print("neg")
+        # MSM has no neg instruction: -x is computed as 0 - x
+        self.emit(OP_PUSH, 0)
+        yield node.enfant[0]
+        self.emit(OP_SUB)
 
     def gen_nd_add(self, node):
-        self.generate(node.enfant[0])
-        self.generate(node.enfant[1])
-        print("add")
+        yield node.enfant[0]
+        yield node.enfant[1]
+        self.emit(OP_ADD)
 
     def gen_nd_sub(self, node):
-        self.generate(node.enfant[0])
-        self.generate(node.enfant[1])
-        print("sub")
+        yield node.enfant[0]
+        yield node.enfant[1]
+        self.emit(OP_SUB)
 
     def gen_nd_mul(self, node):
-        self.generate(node.enfant[0])
-        self.generate(node.enfant[1])
-        print("mul")
+        yield node.enfant[0]
+        yield node.enfant[1]
+        self.emit(OP_MUL)
 
     def gen_nd_div(self, node):
-        self.generate(node.enfant[0])
-        self.generate(node.enfant[1])
-        print("div")
+        yield node.enfant[0]
+        yield node.enfant[1]
+        self.emit(OP_DIV)
 
     def gen_nd_lt(self, node):
-        self.generate(node.enfant[0])
-        self.generate(node.enfant[1])
-        print("cmplt")
+        yield node.enfant[0]
+        yield node.enfant[1]
+        self.emit(OP_CMPLT)
 
     def gen_nd_gt(self, node):
-        self.generate(node.enfant[0])
-        self.generate(node.enfant[1])
-        print("cmpgt")
+        yield node.enfant[0]
+        yield node.enfant[1]
+        self.emit(OP_CMPGT)
 
     def gen_nd_le(self, node):
-        self.generate(node.enfant[0])
-        self.generate(node.enfant[1])
-        print("cmple")
+        yield node.enfant[0]
+        yield node.enfant[1]
+        self.emit(OP_CMPLE)
 
     def gen_nd_ge(self, node):
-        self.generate(node.enfant[0])
-        self.generate(node.enfant[1])
-        print("cmpge")
+        yield node.enfant[0]
+        yield node.enfant[1]
+        self.emit(OP_CMPGE)
 
     def gen_nd_eq(self, node):
-        self.generate(node.enfant[0])
-        self.generate(node.enfant[1])
-        print("cmpeq")
+        yield node.enfant[0]
+        yield node.enfant[1]
+        self.emit(OP_CMPEQ)
 
     def gen_nd_ne(self, node):
-        self.generate(node.enfant[0])
-        self.generate(node.enfant[1])
-        print("cmpne")
+        yield node.enfant[0]
+        yield node.enfant[1]
+        self.emit(OP_CMPNE)
 
     def gen_nd_ident(self, node):
-        print("get", node.address)
+        self.emit(OP_GET, node.address)
 
     def gen_nd_debug(self, node):
-        self.generate(node.enfant[0])
-        print("send")
+        yield node.enfant[0]
+        self.emit(OP_SEND)
 
     def gen_nd_drop(self, node):
-        self.generate(node.enfant[0])
-        print("drop", 1)
+        yield node.enfant[0]
+        self.emit(OP_DROP, 1)
 
     def gen_nd_decl(self, node):
         """Declarations don't generate code by themselves"""
         pass
 
     def gen_nd_assign(self, node):
-        self.generate(node.enfant[1])  
-        print("dup")
-        print("set", node.enfant[0].address)
-        print("drop", "1")
+        yield node.enfant[1]  
+        self.emit(OP_DUP)
+        self.emit(OP_SET, node.enfant[0].address)
+        self.emit(OP_DROP, 1)
 
     def gen_nd_block(self, node):
         # Only emit resn for the root block with total count
-        if hasattr(node, 'is_root') and node.is_root and node.total_declarations > 0:
-            print("resn", node.total_declarations)
+        if node.is_root and node.total_declarations > 0:
+            self.emit(OP_RESN, node.total_declarations)
 
         # Generate code for all children
         for child in node.enfant:
-            self.generate(child)
+            yield child
 
         # Only emit drop for the root block with total count
-        if hasattr(node, 'is_root') and node.is_root:
-            # Calculate total variables to drop (sum of all scopes)
-            total_to_drop = self.symbol_table.next_address
-            if total_to_drop > 0:
-                print("drop", total_to_drop)
+        if node.is_root and node.total_declarations > 0:
+            self.emit(OP_DROP, node.total_declarations)
 
     def gen_nd_if(self, node):
-        self.generate(node.enfant[0])  # condition
-        L_else = new_label()
-        L_end = new_label()
-        print("jumpf", L_else)
-        self.generate(node.enfant[1])  # bloc if
-        print("jump", L_end)
-        print(f".{L_else}")
+        L_else = self.new_label()
+        L_end = self.new_label()
+        yield from self._branch(node.enfant[0], L_else, False)  # condition
+        yield node.enfant[1]  # bloc if
+        self.emit(OP_JUMP, L_end)
+        self.label(L_else)
         if len(node.enfant) > 2:       # bloc else
-            self.generate(node.enfant[2])
-        print(f".{L_end}")
+            yield node.enfant[2]
+        self.label(L_end)
 
     def gen_nd_for(self, node):
-        L_start= new_label()
-        L_end= new_label()
-        self.generate(node.enfant[0]) # intialisation 
-        print("."+L_start)
+        if self.rotate_loops:
+            yield node.enfant[0] # intialisation
+            yield from self._rotated_loop(node.enfant[1], node.enfant[3], node.enfant[2])
+            return
+        L_start= self.new_label()
+        L_end= self.new_label()
+        yield node.enfant[0] # intialisation 
+        self.label(L_start)
 
-        self.generate(node.enfant[1]) #condition
-        print("jumpf",L_end)
+        yield from self._branch(node.enfant[1], L_end, False) #condition
 
-        self.generate(node.enfant[3]) #corps
+        self.break_labels.append(L_end)
+        yield node.enfant[3] #corps
+        self.break_labels.pop()
 
-        self.generate(node.enfant[2]) # incremen
+        yield node.enfant[2] # incremen
 
-        print("jump",L_start)
+        self.emit(OP_JUMP, L_start)
 
-        print("."+L_end)
+        self.label(L_end)
 
     def gen_nd_while(self, node):
-        L_start = new_label()
-        L_end = new_label()
+        if self.rotate_loops:
+            yield from self._rotated_loop(node.enfant[0], node.enfant[1])
+            return
+        L_start = self.new_label()
+        L_end = self.new_label()
         
-        print("."+L_start)
+        self.label(L_start)
 
-        self.generate(node.enfant[0])  # Condition
-        print("jumpf", L_end)
-        self.generate(node.enfant[1])  # Body
-        print("jump", L_start)
-        print("."+L_end)
+        yield from self._branch(node.enfant[0], L_end, False)  # Condition
+        self.break_labels.append(L_end)
+        yield node.enfant[1]  # Body
+        self.break_labels.pop()
+        self.emit(OP_JUMP, L_start)
+        self.label(L_end)
+
+    def _rotated_loop(self, condition, body, increment=None):
+        """Loop tested once before entry, then at the bottom of each iteration
+
+        Like a do-while behind a guard: an iteration ends with a single
+        jumpt back to the body instead of a jump to a test at the top. The
+        condition code is emitted twice.
+        """
+        L_body = self.new_label()
+        L_end = self.new_label()
+        yield from self._branch(condition, L_end, False)
+        self.label(L_body)
+        self.break_labels.append(L_end)
+        yield body
+        self.break_labels.pop()
+        if increment is not None:
+            yield increment
+        yield from self._branch(condition, L_body, True)
+        self.label(L_end)
 
     def gen_nd_dowhile(self, node):
-        L_start=new_label()
-        L_condition=new_label()
-
-        print(f".{L_start}")
-        self.generate(node.enfant[0]) #on execute le corps 
-        print(f".{L_condition}")
-        self.generate(node.enfant[1]) #condition
-        print("jumpt", L_start) #jump back if true
+        L_start=self.new_label()
+        L_condition=self.new_label()
+        L_end = self.new_label()
+
+        self.label(L_start)
+        self.break_labels.append(L_end)
+        yield node.enfant[0] #on execute le corps 
+        self.break_labels.pop()
+        self.label(L_condition)
+        yield from self._branch(node.enfant[1], L_start, True) #jump back if true
+        self.label(L_end)
+
+    def gen_nd_break(self, node):
+        self.emit(OP_JUMP, self.break_labels[-1])
+
+    def gen_nd_switch(self, node):
+        """Store the value, dispatch on it, then the body with its labels
+
+        The dispatch is a balanced tree of comparisons on the sorted case
+        values: O(log n) comparisons instead of one per case. When the
+        values are dense, a range check first bounds the value, and the
+        tree then needs no equality test at its leaves.
+        """
+        expr, body = node.enfant
+        yield expr
+        self.emit(OP_SET, node.address)
+
+        L_end = self.new_label()
+        cases = []
+        default = L_end
+        for item in body.enfant:
+            if item.type == ND_CASE:
+                label = self.new_label()
+                cases.append((item.valeur, label))
+                self.case_labels[id(item)] = label
+            elif item.type == ND_DEFAULT:
+                default = self.new_label()
+                self.case_labels[id(item)] = default
+        cases.sort()
+
+        if cases and is_dense(cases):
+            low, high = cases[0][0], cases[-1][0]
+            self._compare_jump(node.address, OP_CMPLT, low, default)
+            self._compare_jump(node.address, OP_CMPGT, high, default)
+            self._dispatch(node.address, cases, low, high, default)
+        else:
+            self._dispatch(node.address, cases, None, None, default)
+
+        self.break_labels.append(L_end)
+        yield body
+        self.break_labels.pop()
+        self.label(L_end)
+
+    def _dispatch(self, address, cases, low, high, default):
+        """Jump to the label of the value, known to lie in [low, high]"""
+        target = _known_target(cases, low, high, default)
+        if target is not None:
+            self.emit(OP_JUMP, target)
+            return
+        if len(cases) == 1:
+            value, label = cases[0]
+            self._compare_jump(address, OP_CMPEQ, value, label)
+            self.emit(OP_JUMP, default)
+            return
+        middle = len(cases) // 2
+        pivot = cases[middle][0]
+        # below the pivot: straight to the target when it needs no more test
+        target = _known_target(cases[:middle], low, pivot - 1, default)
+        L_low = target if target is not None else self.new_label()
+        self._compare_jump(address, OP_CMPLT, pivot, L_low)
+        self._dispatch(address, cases[middle:], pivot, high, default)
+        if target is None:
+            self.label(L_low)
+            self._dispatch(address, cases[:middle], low, pivot - 1, default)
+
+    def _compare_jump(self, address, op, value, label):
+        """if (slot op value) jump label"""
+        self.emit(OP_GET, address)
+        self.emit(OP_PUSH, value)
+        self.emit(op)
+        self.emit(OP_JUMPT, label)
+
+    def gen_nd_case(self, node):
+        self.label(self.case_labels.pop(id(node)))
+
+    gen_nd_default = gen_nd_case
     
+    def gen_nd_program(self, node):
+        """Top-level statements, a call to main if defined, then the functions"""
+        if node.total_declarations > 0:
+            self.emit(OP_RESN, node.total_declarations)
+        functions = [c for c in node.enfant if c.type == ND_FUNC_DECL]
+        for child in node.enfant:
+            if child.type != ND_FUNC_DECL:
+                yield child
+        if self.call_main and any(f.chaine == "main" for f in functions):
+            self.emit(OP_PREP, "main")
+            self.emit(OP_CALL, 0)
+            self.emit(OP_DROP, 1)
+        if node.total_declarations > 0:
+            self.emit(OP_DROP, node.total_declarations)
+        self.emit(OP_HALT)
+        for function in functions:
+            yield function
+
     def gen_nd_func_decl(self, node):
+        if node.cached_code is not None:
+            # unchanged since the last compilation: reuse its code
+            self.emitter.code.extend(node.cached_code)
+            return
+        start = len(self.emitter.code)
         func_name=node.chaine
-        print(f".{func_name}")
+        self.function = func_name
+        self.function_labels = 0
+        self.function_params = sum(1 for child in node.enfant if child.is_parameter)
+        self.label(func_name)
         # paramètres déjà sur la pile → réserve variables locales
         body = node.enfant[-1]
-        local_vars=sum(1 for c in body.enfant if c.type==ND_DECL)
+        local_vars = node.local_count
         if local_vars > 0:
-            print("resn",local_vars)
+            self.emit(OP_RESN, local_vars)
+        # point d'entrée des appels terminaux : après le resn, le cadre est déjà là
+        self.entry_label = None
+        if self.tail_calls and any(self._is_tail_call(call) for call in returned_calls(body)):
+            self.entry_label = self.new_label()
+            self.label(self.entry_label)
 
         #genere le corps
-        self.generate(body)
+        yield body
 
-        print("ret")
+        self.emit(OP_RET)
+        self.function = None
+        self.entry_label = None
+        self.function_code[func_name] = self.emitter.code[start:]
 
     def gen_nd_func_call(self, node):
         func_name = node.chaine
         n_args= len(node.enfant)
         
-        print(f"prep {func_name}")
+        self.emit(OP_PREP, func_name)
         for arg in node.enfant:
-            self.generate(arg)
-        print(f"call {n_args}")
+            yield arg
+        self.emit(OP_CALL, n_args)
 
     def gen_nd_return(self,node):
-        self.generate(node.enfant[0])
-        print("ret")
+        value = node.enfant[0]
+        if self.entry_label is not None and not self.inline_ends and self._is_tail_call(value):
+            yield from self._tail_call(value)
+            return
+        yield value
+        if self.inline_ends:
+            # inlined call: the value stays on the stack
+            self.emit(OP_JUMP, self.inline_ends[-1])
+        else:
+            self.emit(OP_RET)
+
+    def _is_tail_call(self, node):
+        """True for a call to the current function with all its arguments"""
+        return (node.type == ND_FUNC_CALL and node.chaine == self.function
+                and len(node.enfant) == self.function_params)
+
+    def _tail_call(self, call):
+        """return f(...) in f: reassign the parameters, jump back to the entry
+
+        The frame is reused, so deep recursion runs in constant stack space.
+        All the arguments are evaluated before any parameter is overwritten;
+        a parameter passed unchanged in its own position is left alone.
+        """
+        changed = [i for i, arg in enumerate(call.enfant)
+                   if not (arg.type == ND_IDENT and arg.address == i)]
+        for i in changed:
+            yield call.enfant[i]
+        for i in reversed(changed):
+            self.emit(OP_SET, i)
+        self.emit(OP_JUMP, self.entry_label)
+
+    def gen_nd_inline(self, node):
+        """Inlined call: parameters assigned, then the body up to its return"""
+        L_end = self.new_label()
+        self.inline_ends.append(L_end)
+        for child in node.enfant:
+            yield child
+        self.inline_ends.pop()
+        self.label(L_end)
 
     def gen_nd_array_decl(self, node):
         """Array declarations reserve space during resn"""
@@ -428,18 +755,25 @@ class CodeGenerator:
 
     def gen_nd_array_access(self, node):
         """Generate code for array access: arr[index]"""
-        print("push", node.enfant[0].address) #get base address of array
-        self.generate(node.enfant[1])  # index
-        print("add")
-        print("read")
+        yield from self._element_address(node.enfant[0], node.enfant[1])
+        self.emit(OP_READ)
 
     def gen_nd_array_assign(self, node):
         """Generate code for array assignment: arr[index] = value;"""
-        print("push", node.enfant[0].address)
-        self.generate(node.enfant[1])  # index
-        print("add")
-        self.generate(node.enfant[2])
-        print("write")
+        # msm's write takes the address on top and the value below it
+        yield node.enfant[2]
+        yield from self._element_address(node.enfant[0], node.enfant[1])
+        self.emit(OP_WRITE)
+
+    def _element_address(self, array, index):
+        """Push the address of array[index]"""
+        if index.type == ND_CONST:
+            # known at compile time: one push instead of push; <index>; add
+            self.emit(OP_PUSH, array.address + index.valeur)
+            return
+        self.emit(OP_PUSH, array.address) #get base address of array
+        yield index
+        self.emit(OP_ADD)
     
     def gen_nd_ptr_decl(self, node):
         """Pointer declarations reserve one slot like regular variables"""
@@ -451,113 +785,426 @@ class CodeGenerator:
         
         if operand.type == ND_IDENT:
             # Push the address (not the value) of the variable
-            print("push", operand.address)
+            self.emit(OP_PUSH, operand.address)
         elif operand.type == ND_ARRAY_ACCESS:
             # For &arr[i], calculate arr_base + i
-            print("push", operand.enfant[0].address)
-            self.generate(operand.enfant[1])  # index
-            print("add")
+            yield from self._element_address(operand.enfant[0], operand.enfant[1])
         else:
-            raise ValueError(f"Cannot take address of {operand.type}")
+            raise ValueError(f"Cannot take address of {NODE_NAMES[operand.type]}")
         
     def gen_nd_deref(self, node):
         """Generate code for dereference: *ptr"""
         # Evaluate the pointer expression to get an address
-        self.generate(node.enfant[0])
+        yield node.enfant[0]
         # Read from that address
-        print("read")
+        self.emit(OP_READ)
     
     def gen_nd_deref_assign(self, node):
         """Generate code for *ptr = value;"""
         # Evaluate the value
-        self.generate(node.enfant[1])
+        yield node.enfant[1]
         
         # Evaluate the pointer to get address
-        self.generate(node.enfant[0])
+        yield node.enfant[0]
         
         # Write value to address
-        print("write")
+        self.emit(OP_WRITE)
     
     def gen_nd_for_decl(self, node):
         """Generate code for for-loop declaration+initialization"""
         # Generate declaration (usually does nothing)
-        self.generate(node.enfant[0])
+        yield node.enfant[0]
         # Generate assignment
-        self.generate(node.enfant[1])
-
-        def gen_nd_for(self, node):
-            L_start = new_label()
-            L_end = new_label()
-            
-            # Initialization (might be ND_FOR_DECL or regular expression)
-            self.generate(node.enfant[0])
-            
-            print(f".{L_start}")
-            
-            # Condition
-            self.generate(node.enfant[1])
-            print("jumpf", L_end)
-            
-            # Body
-            self.generate(node.enfant[3])
-            
-            # Increment
-            self.generate(node.enfant[2])
-            
-            print("jump", L_start)
-            print(f".{L_end}")
-    
-    def gen_nd_and(self,node):
-        self.generate(node.enfant[0])
-        self.generate(node.enfant[1])
-        print("and")
-    
-    def gen_nd_or(self,node):
-        self.generate(node.enfant[0])
-        self.generate(node.enfant[1])
-        print("or")
-    
-    
-    
-        
-def compile_code(source_code, output_file=None, show_ast=False):
-    """Complete compilation pipeline"""
+        yield node.enfant[1]
+
+    def gen_nd_and(self, node):
+        """a && b (and a || b) as a value: branches, then 0 or 1
+
+        The right operand is only evaluated when the left one does not
+        decide the result.
+        """
+        L_false = self.new_label()
+        L_end = self.new_label()
+        yield from self._branch(node, L_false, False)
+        self.emit(OP_PUSH, 1)
+        self.emit(OP_JUMP, L_end)
+        self.label(L_false)
+        self.emit(OP_PUSH, 0)
+        self.label(L_end)
+
+    gen_nd_or = gen_nd_and
+
+    def _branch(self, cond, label, jump_if):
+        """Jump to label when the truth value of cond is jump_if, else fall through
+
+        && and || become chains of jumps (short-circuit), ! flips the sense
+        of the jumps, and a constant is a jump or nothing: no 0/1 value is
+        computed for them. The other expressions are evaluated, then tested
+        by jumpt/jumpf. The pending conditions are kept on a list, so long
+        chains need no Python recursion.
+        """
+        work = [(cond, label, jump_if)]
+        while work:
+            item = work.pop()
+            if type(item) is str:   # end of a && / || that fell through
+                self.label(item)
+                continue
+            node, target, sense = item
+            kind = node.type
+            if kind == ND_NOT:
+                work.append((node.enfant[0], target, not sense))
+            elif kind in (ND_AND, ND_OR):
+                left, right = node.enfant
+                decides = kind == ND_OR   # value of left that decides the result
+                if sense == decides:
+                    # a || b jumps if either is true, a && b if either is false
+                    work.append((right, target, sense))
+                    work.append((left, target, sense))
+                else:
+                    # left deciding the result skips right and the jump
+                    L_skip = self.new_label()
+                    work.append(L_skip)
+                    work.append((right, target, sense))
+                    work.append((left, L_skip, decides))
+            elif kind == ND_CONST:
+                if bool(node.valeur) == sense:
+                    self.emit(OP_JUMP, target)
+            else:
+                yield node
+                self.emit(OP_JUMPT if sense else OP_JUMPF, target)
+
+
+class CompilationResult:
+    """Result of compile_code: the instruction list, its header and a few statistics"""
+    def __init__(self, instructions, stats=None, header=None):
+        self.instructions = instructions       # [(opcode, operand)], labels as OP_LABEL
+        self.labels = label_table(instructions)  # {name: index in instructions}
+        self.header = header or {}             # metadata written as leading comments
+        self.stats = {
+            "instructions": sum(1 for op, _ in instructions if op != OP_LABEL),
+            "labels": len(self.labels),
+        }
+        if stats:
+            self.stats.update(stats)
+
+    def to_text(self):
+        """Render the program in MSM text format, header first"""
+        return format_header(self.header) + format_instructions(self.instructions)
+
+
+COMPILER_VERSION = "0.13"
+
+
+class CompilationContext:
+    """Options and state of one compilation
+
+    Everything a compilation mutates lives here or in objects it owns, so
+    several compilations can run in the same process (threads included).
+    """
+    def __init__(self, show_ast=False, opt_level=1, peephole_rules=None, cache=None,
+                 instrumentation=None, inline_budget=INLINE_BUDGET, object_code=False):
+        self.show_ast = show_ast
+        self.opt_level = opt_level
+        self.inline_budget = inline_budget
+        self.object_code = object_code
+        self.peephole_rules = peephole_rules
+        self.cache = cache
+        self.instrumentation = instrumentation if instrumentation is not None else Instrumentation()
+        self.symbol_table = SymbolTable()
+        self.stats = {}
+
+    def options(self):
+        """Options that change the generated code (used in cache keys)"""
+        return {
+            "version": COMPILER_VERSION,
+            "ast": self.show_ast,
+            "opt_level": self.opt_level,
+            "inline_budget": self.inline_budget,
+            "object_code": self.object_code,
+            "peephole_rules": sorted(self.peephole_rules) if self.peephole_rules is not None else None,
+        }
+
+AST_COMMENT = "; AST: "
+
+
+def compile_code(source_code, output_file=None, show_ast=False, verbose=True,
+                 opt_level=1, peephole_rules=None, cache=None, hooks=None, trace_memory=False,
+                 inline_budget=INLINE_BUDGET, object_code=False):
+    """Complete compilation pipeline, returns a CompilationResult
+
+    The program is written to output_file if given, otherwise listed on the
+    console when verbose. opt_level 0 disables the optimizations,
+    inline_budget bounds the functions inlined (0: none) and peephole_rules
+    restricts the peephole pass. object_code produces an object for
+    linker.py. cache is a CompilationCache; hooks and trace_memory set up
+    the instrumentation (instrumentation.py).
+    """
+    instrumentation = Instrumentation(hooks, trace_memory)
+    context = CompilationContext(show_ast, opt_level, peephole_rules, cache, instrumentation,
+                                 inline_budget, object_code)
+    instrumentation.start()
+    try:
+        result = _compile_cached(source_code, context)
+        if output_file:
+            with instrumentation.phase("output"):
+                with open(output_file, 'w') as f:
+                    f.write(result.to_text())
+            if verbose:
+                print(f"Code generated to {output_file}")
+        elif verbose:
+            #print to console
+            sys.stdout.write("Instructions:\n" + result.to_text())
+        if instrumentation.enabled:
+            instrumentation.emit(_summary(result, context))
+    finally:
+        instrumentation.stop()
+    passes = result.stats["passes"] = {}
+    for name, seconds in instrumentation.phases():
+        passes[name] = passes.get(name, 0.0) + seconds
+    return result
+
+
+def _compile_cached(source_code, context):
+    """Whole-file cache lookup around _compile
+
+    A hit returns the stored program without lexing, parsing or analyzing.
+    """
+    cache = context.cache
+    show_ast = context.show_ast
+    if cache is not None:
+        with context.instrumentation.phase("cache"):
+            key = cache.key(source_code, context.options())
+            text = cache.get(key)
+        if text is not None:
+            if show_ast:
+                for line in text.splitlines():
+                    if line.startswith(AST_COMMENT):
+                        print("AST: " + line[len(AST_COMMENT):])
+            return CompilationResult(parse_instructions(text), {"cached": True}, parse_header(text))
+
+    result, ast_text = _compile(source_code, context)
+    if show_ast:
+        print("AST: " + ast_text)
+    if cache is not None:
+        # After the program, so that parse_header stops before it
+        trailer = AST_COMMENT + ast_text + "\n" if show_ast else ""
+        cache.put(key, result.to_text() + trailer)
+    return result
+
+
+def _summary(result, context):
+    """Final event for the hooks: counts over the whole compilation"""
+    summary = {"event": "summary",
+               "seconds": sum(seconds for _, seconds in context.instrumentation.phases()),
+               "instructions": result.stats["instructions"],
+               "functions": function_sizes(result.instructions)}
+    for key in ("tokens", "nodes", "frames", "cached"):
+        if key in result.stats:
+            summary[key] = result.stats[key]
+    peaks = [e["peak_bytes"] for e in context.instrumentation.events if "peak_bytes" in e]
+    if peaks:
+        summary["peak_bytes"] = max(peaks)
+    return summary
+
+
+def function_sizes(instructions):
+    """{function: instructions between its label and the next function}
+
+    Function labels are the plain names: generated labels are L<n> or
+    <function>.L<n>, and start/end delimit the program.
+    """
+    sizes = {}
+    current = None
+    for op, arg in instructions:
+        if op == OP_LABEL:
+            if arg in ("start", "end") or "." in arg or (arg[0] == "L" and arg[1:].isdigit()):
+                continue
+            current = arg
+            sizes[current] = 0
+        elif current is not None:
+            sizes[current] += 1
+    return sizes
+
+
+def _compile(source_code, context):
+    """Run every phase, return (CompilationResult, AST in Lisp form or None)"""
+    cache = context.cache
+    stats = context.stats
+    instrumentation = context.instrumentation
+    phase = instrumentation.phase
+
     # Parse
-    ast = parse(source_code)
+    with phase("lexer") as record:
+        lexer = BulkLexer(source_code)
+        record["tokens"] = stats["tokens"] = len(lexer.kinds) - 1
+    with phase("parser"):
+        ast = Parser(lexer).parse_program()
+    del lexer
+    if instrumentation.enabled:
+        stats["nodes"] = count_nodes(ast)   # outside the timed phase
+
+    # Reuse the code of unchanged functions
+    function_keys = {}
+    if cache is not None and ast.type == ND_PROGRAM:
+        with phase("function-cache"):
+            function_options = dict(context.options(), function=True)
+            hashes = {c.chaine: c.token_hash for c in ast.enfant if c.type == ND_FUNC_DECL}
+            calls = {c.chaine: called_functions(c) & hashes.keys()
+                     for c in ast.enfant if c.type == ND_FUNC_DECL}
+            for child in ast.enfant:
+                if child.type != ND_FUNC_DECL:
+                    continue
+                # the code of a function includes the callees inlined in it,
+                # and the callees inlined in them
+                callees = sorted(reachable_functions(child.chaine, calls))
+                key = cache.key("".join(hashes[name] for name in callees), function_options)
+                text = cache.get(key)
+                if text is not None:
+                    child.cached_code = parse_instructions(text)
+                else:
+                    function_keys[child.chaine] = key
+        stats["functions_reused"] = sum(1 for c in ast.enfant if c.cached_code is not None)
     
-    # Semantic analysis
-    symbol_table = SymbolTable()
-    analyzer = SemanticAnalyzer(symbol_table)
-    analyzer.analyze(ast)
+    # Semantic analysis, cached functions included: the new code may
+    # inline them, so a warm build gives the same code as a cold one
+    symbol_table = context.symbol_table
+    with phase("semantic"):
+        analyzer = SemanticAnalyzer(symbol_table)
+        analyzer.analyze(ast)
+
+    # AST optimizations
+    if context.opt_level >= 1:
+        with phase("optimize"):
+            stats["folded"] = stats["eliminated"] = 0
+            items = ast.enfant if ast.type == ND_PROGRAM else [ast]
+            reused = reused_callees(items)
+            for i, item in enumerate(items):
+                if item.cached_code is not None and item.chaine not in reused:
+                    continue
+                item, folded = fold_constants(item)
+                item, eliminated = eliminate_dead_code(item)
+                items[i] = item
+                stats["folded"] += folded
+                stats["eliminated"] += eliminated
+            if ast.type != ND_PROGRAM:
+                ast = items[0]
+            ast, stats["inlining"] = inline_calls(ast, context.inline_budget, reused)
+            ast, stats["hoisted"] = hoist_invariants(ast)
+        with phase("frames"):
+            stats["frames"] = layout_frames(ast)
     
-    # Show AST if requested
-    if show_ast:
-        print("AST: ", end="")
-        ast.afficher()
-        print()
+    ast_text = ast.lisp() if context.show_ast else None
     
     # Code generation
-    if output_file:
-        #Redirect print to file
-        import sys 
-        orignal_stdout=sys.stdout 
-        with open(output_file,'w') as f:
-            sys.stdout=f
-            print(".start")
-            generator = CodeGenerator(symbol_table)
-            generator.generate(ast)
-            print("halt")
-            print(".end")
-        sys.stdout=orignal_stdout
-        print(f"Code generated to {output_file}")
-    else:
-        #print to console
-        print("Instructions:")
-        print(".start")
-        generator = CodeGenerator(symbol_table)
+    with phase("codegen") as record:
+        emitter = Emitter()
+        emitter.label("start")
+        generator = CodeGenerator(symbol_table, emitter, tail_calls=context.opt_level >= 1,
+                                  rotate_loops=context.opt_level >= 1,
+                                  call_main=not context.object_code)
         generator.generate(ast)
-        print("halt")
-        print(".end")
+        emitter.emit(OP_HALT)
+        emitter.label("end")
+        code = emitter.code
+        record["instructions"] = stats["generated"] = emitter.instruction_count()
+
+    for name, key in function_keys.items():
+        cache.put(key, format_instructions(generator.function_code[name]))
+
+    # An object keeps all its functions: other objects may call them
+    defines = []
+    if context.object_code and ast.type == ND_PROGRAM:
+        defines = [child.chaine for child in ast.enfant if child.type == ND_FUNC_DECL]
+
+    # Basic-block passes, then back to a list of instructions
+    if context.opt_level >= 1:
+        with phase("cfg") as record:
+            graph = build_cfg(code, defines)
+            blocks = len(graph.blocks)
+            stats["cfg"] = run_passes(graph)
+            stats["blocks"] = (blocks, len(graph.blocks))
+            code = linearize(graph)
+            record["blocks"] = len(graph.blocks)
+
+    # Optimization
+    if context.opt_level >= 1:
+        with phase("peephole") as record:
+            code, stats["peephole"] = peephole.optimize(code, context.peephole_rules)
+            record["removed"] = sum(stats["peephole"].values())
+
+    if context.object_code:
+        return CompilationResult(code, stats, object_header(code, defines)), ast_text
+
+    # Stack bound, so that a runner can size its memory
+    with phase("stack") as record:
+        stats["stack"] = analyze_stack(code)
+        record["peak"] = stats["stack"].peak
+
+    return CompilationResult(code, stats, stats["stack"].header()), ast_text
+
+
+def called_functions(node):
+    """Names of the functions called in a subtree"""
+    names = set()
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if node.type == ND_FUNC_CALL:
+            names.add(node.chaine)
+        stack.extend(node.enfant)
+    return names
+
+
+def returned_calls(node):
+    """Calls whose value is returned directly (return f(...)) in a subtree"""
+    calls = []
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if node.type == ND_RETURN and node.enfant[0].type == ND_FUNC_CALL:
+            calls.append(node.enfant[0])
+        stack.extend(node.enfant)
+    return calls
+
+
+def reused_callees(items):
+    """Functions reused from the cache that the other items call, directly or not
+
+    Their AST still goes through folding and inlining: the new code may
+    inline them, and must come out as in a build without the cache.
+    """
+    functions = {item.chaine: item for item in items if item.type == ND_FUNC_DECL}
+    calls = {name: called_functions(function) & functions.keys()
+             for name, function in functions.items()}
+    reached = set()
+    for item in items:
+        if item.cached_code is None:
+            for name in called_functions(item) & functions.keys():
+                reached |= reachable_functions(name, calls)
+    return {name for name in reached if functions[name].cached_code is not None}
+
+
+def reachable_functions(name, calls):
+    """name and the functions it calls, directly or not ({function: called names})"""
+    seen = {name}
+    stack = [name]
+    while stack:
+        for callee in calls[stack.pop()]:
+            if callee not in seen:
+                seen.add(callee)
+                stack.append(callee)
+    return seen
+
+
+def count_nodes(ast):
+    """Number of nodes in a tree"""
+    count = 0
+    stack = [ast]
+    while stack:
+        node = stack.pop()
+        count += 1
+        stack.extend(node.enfant)
+    return count
 
 
 if __name__ == "__main__":
@@ -1,73 +1,156 @@
-from analyse_lexique import Lexer
+from analyse_lexique import BulkLexer
 
 
 class Nd:
-    def __init__(self, node_type, valeur=None, chaine=None):
+    """AST node with a fixed layout
+
+    type is a small integer kind (ND_*), enfant the list of children (an
+    empty tuple for leaves until a child is added) and address the stack
+    slot filled by the semantic analysis. The other semantic annotations,
+    declared in ANNOTATIONS, are set on few nodes: they are properties
+    stored in a dictionary created on first write.
+    """
+    # Annotation -> default value
+    ANNOTATIONS = {
+        "array_size": None,         # int arr[N]
+        "is_pointer": False,        # int* declaration or parameter
+        "is_parameter": False,      # function parameter declaration
+        "param_type": None,
+        "return_type": None,        # function declaration
+        "local_count": 0,           # function: locals after the parameters
+        "total_declarations": 0,    # slots reserved by a root block or program
+        "is_root": False,           # outermost block of the program
+        "direct_decl_count": 0,
+        "drop_count": 0,            # slots released when leaving a block
+        "token_hash": None,         # function: fingerprint of its tokens
+        "cached_code": None,        # function: code reused from the cache
+    }
+    __slots__ = ("type", "valeur", "chaine", "enfant", "address", "annotations")
+
+    def __init__(self, node_type, valeur=None, chaine=None, children=None):
         self.type = node_type
         self.valeur = valeur
         self.chaine = chaine
-        self.enfant = []
-        self.address = None  # For semantic analysis
-        self.array_size= None 
-        self.is_pointer = False  # NEW: track if variable is a pointer
+        self.enfant = children if children else ()
+        self.address = None
+        self.annotations = None
 
-    
     def ajouter_enfant(self, enfant_node):
         """Ajoute un enfant au nœud"""
-        self.enfant.append(enfant_node)
+        if self.enfant:
+            self.enfant.append(enfant_node)
+        else:
+            self.enfant = [enfant_node]
     
     def afficher(self, indent=0):
         """Affiche l'arbre en format Lisp"""
-        print("(" + self.type, end="")
-        if self.valeur is not None:
-            print(f" {self.valeur}", end="")
-        if self.chaine is not None:
-            print(f' "{self.chaine}"', end="")
-        
-        for enfant in self.enfant:
-            print(" ", end="")
-            enfant.afficher()
-        
-        print(")", end="")
-
-
-# Node type constants
-ND_CONST = "nd_const"
-ND_NOT = "nd_not"
-ND_NEG = "nd_neg"
-ND_ADD = "nd_add"
-ND_SUB = "nd_sub"
-ND_MUL = "nd_mul"
-ND_DIV = "nd_div"
-ND_LT = "nd_lt"
-ND_GT = "nd_gt"
-ND_LE = "nd_le"
-ND_GE = "nd_ge"
-ND_EQ = "nd_eq"
-ND_NE = "nd_ne"
-ND_IDENT = "nd_ident"
-ND_DECL = "nd_decl"
-ND_ASSIGN = "nd_assign"
-ND_IF = "nd_if"
-ND_WHILE = "nd_while"
-ND_DEBUG = "nd_debug"
-ND_BLOCK = "nd_block"
-ND_DROP = "nd_drop"
-ND_FOR="nd_for"
-ND_DOWHILE="nd_dowhile"
-ND_ARRAY_DECL="nd_array_decl" #int arr[10];
-ND_ARRAY_ACCESS="nd_array_access" #arr[5]
-ND_ARRAY_ASSIGN="nd_array_assign" #arr[5]=10;
-ND_FUNC_DECL="nd_func_decl"
-ND_FUNC_CALL="nd_func_call"
-ND_RETURN="nd_return"
-ND_PTR_DECL = "nd_ptr_decl"        # int* ptr;
-ND_ADDRESS_OF = "nd_address_of"    # &x
-ND_DEREF = "nd_deref"              # *ptr (as expression)
-ND_DEREF_ASSIGN = "nd_deref_assign" # *ptr = value;
-ND_FOR_DECL = "nd_for_decl"  # Special node for for-loop declaration+init
-ND_AND="nd_and"
-ND_OR="nd_or"
+        print(self.lisp(), end="")
+
+    def lisp(self):
+        """Renvoie l'arbre en format Lisp"""
+        parts = []
+        stack = [self]   # nodes still to print, or text
+        while stack:
+            node = stack.pop()
+            if type(node) is str:
+                parts.append(node)
+                continue
+            parts.append("(" + NODE_NAMES[node.type])
+            if node.valeur is not None:
+                parts.append(f" {node.valeur}")
+            if node.chaine is not None:
+                parts.append(f' "{node.chaine}"')
+            stack.append(")")
+            for enfant in reversed(node.enfant):
+                stack.append(enfant)
+                stack.append(" ")
+        return "".join(parts)
+
+
+def _annotation(name, default):
+    def get_(node):
+        annotations = node.annotations
+        return default if annotations is None else annotations.get(name, default)
+
+    def set_(node, value):
+        if node.annotations is None:
+            node.annotations = {}
+        node.annotations[name] = value
+
+    return property(get_, set_)
+
+
+for _name, _default in Nd.ANNOTATIONS.items():
+    setattr(Nd, _name, _annotation(_name, _default))
+
+
+# Node kinds: small integers, NODE_NAMES[kind] is the printed name
+ND_CONST = 0
+ND_NOT = 1
+ND_NEG = 2
+ND_ADD = 3
+ND_SUB = 4
+ND_MUL = 5
+ND_DIV = 6
+ND_LT = 7
+ND_GT = 8
+ND_LE = 9
+ND_GE = 10
+ND_EQ = 11
+ND_NE = 12
+ND_IDENT = 13
+ND_DECL = 14
+ND_ASSIGN = 15
+ND_IF = 16
+ND_WHILE = 17
+ND_DEBUG = 18
+ND_BLOCK = 19
+ND_DROP = 20
+ND_FOR = 21
+ND_DOWHILE = 22
+ND_ARRAY_DECL = 23  # int arr[10];
+ND_ARRAY_ACCESS = 24  # arr[5]
+ND_ARRAY_ASSIGN = 25  # arr[5]=10;
+ND_FUNC_DECL = 26
+ND_FUNC_CALL = 27
+ND_RETURN = 28
+ND_PTR_DECL = 29    # int* ptr;
+ND_ADDRESS_OF = 30  # &x
+ND_DEREF = 31       # *ptr (as expression)
+ND_DEREF_ASSIGN = 32  # *ptr = value;
+ND_FOR_DECL = 33    # Special node for for-loop declaration+init
+ND_AND = 34
+ND_OR = 35
+ND_PROGRAM = 36     # translation unit: several top-level items
+ND_SWITCH = 37      # switch (expr) { ... }: expression, then an ND_BLOCK body
+ND_CASE = 38        # case C: marker in a switch body, valeur = C once analyzed
+ND_DEFAULT = 39     # default: marker in a switch body
+ND_BREAK = 40       # break; leaves the innermost loop or switch
+ND_INLINE = 41      # inlined call (chaine = callee): its statements, value of its return
+
+NODE_NAMES = [
+    "nd_const", "nd_not", "nd_neg", "nd_add", "nd_sub",
+    "nd_mul", "nd_div", "nd_lt", "nd_gt", "nd_le",
+    "nd_ge", "nd_eq", "nd_ne", "nd_ident", "nd_decl",
+    "nd_assign", "nd_if", "nd_while", "nd_debug", "nd_block",
+    "nd_drop", "nd_for", "nd_dowhile", "nd_array_decl", "nd_array_access",
+    "nd_array_assign", "nd_func_decl", "nd_func_call", "nd_return", "nd_ptr_decl",
+    "nd_address_of", "nd_deref", "nd_deref_assign", "nd_for_decl", "nd_and",
+    "nd_or", "nd_program", "nd_switch", "nd_case", "nd_default",
+    "nd_break", "nd_inline",
+]
+
+# Top-level items that need an ND_PROGRAM around them (functions, storage)
+PROGRAM_ITEMS = (ND_FUNC_DECL, ND_SWITCH, ND_FOR, ND_DECL, ND_PTR_DECL, ND_ARRAY_DECL)
+
+# Prefix operators (None: ignored)
+UNARY_OPS = {
+    "tok_ampersand": ND_ADDRESS_OF,  # &x
+    "tok_star": ND_DEREF,            # *ptr (in operand position)
+    "tok_not": ND_NOT,
+    "tok_minus": ND_NEG,
+    "tok_plus": None,
+}
 
 # Binary operators table
 BINOPS = {
@@ -88,12 +171,11 @@ BINOPS = {
 
 
 def create_node(node_type, valeur=None, chaine=None, children=None):
-    """Create a node with optional value, string, and children"""
-    node = Nd(node_type, valeur, chaine)
-    if children:
-        for child in children:
-            node.ajouter_enfant(child)
-    return node
+    """Create a node with optional value, string, and children
+
+    The node takes ownership of the children list.
+    """
+    return Nd(node_type, valeur, chaine, children)
 
 
 class Parser:
@@ -114,112 +196,114 @@ class Parser:
         self.lexer.next()
         return self.last
 
-    def parse_expression(self, min_prio=0):
-        """Parse expressions with precedence climbing"""
-        left = self.parse_primary()
-
+    def parse_expression(self, min_prio=0, primary=False):
+        """Parse expressions with precedence climbing
+
+        The operands and pending operators are kept on explicit stacks, so
+        nesting depth is not limited by Python recursion. ops holds
+        ("un", nd_type) prefix operators, ("bin", next_min, nd_type) binary
+        operators waiting for their right operand, and the open groups:
+        ("paren",), ("call", name, index of the first argument in values)
+        and ("index", name). With primary=True only a unary expression is
+        parsed (used for *ptr = value;).
+        """
+        values = []
+        ops = []
+        depth = 0   # open groups in ops
         while True:
+            # --- Operand, after its prefix operators ---
             token = self.lexer.peek()
-            if not token or token[0] not in BINOPS:
-                break
-
-            tok_type = token[0]
-            prec, assoc, nd_type = BINOPS[tok_type]
-            if prec < min_prio:
-                break
-
-            self.accept(tok_type)
-            next_min = prec if assoc == "R" else prec + 1
-            right = self.parse_expression(next_min)
-            left = create_node(nd_type, children=[left, right])
-
-        return left
-
-    def parse_primary(self):
-
-        """Parse primary expressions (unary operators and atoms)"""
-        
-        # Address-of operator: &x
-        if self.check("tok_ampersand"):
-            self.accept("tok_ampersand")
-            operand = self.parse_primary()
-            return create_node(ND_ADDRESS_OF, children=[operand])
-        
-        # Dereference or negation
-        if self.check("tok_star"):
-            self.accept("tok_star")
-            # Need to check context - is this dereference or multiply?
-            # In primary position, it's always dereference
-            operand = self.parse_primary()
-            return create_node(ND_DEREF, children=[operand])
-        
-        # Logical NOT
-        if self.check("tok_not"):
-            self.accept("tok_not")
-            return create_node(ND_NOT, children=[self.parse_primary()])
-        
-        # Unary minus
-        if self.check("tok_minus"):
-            self.accept("tok_minus")
-            return create_node(ND_NEG, children=[self.parse_primary()])
-        
-        # Unary plus (just ignored)
-        if self.check("tok_plus"):
-            self.accept("tok_plus")
-            return self.parse_primary()
-        
-        return self.parse_atom()
-
-    def parse_atom(self):
-        """Parse atomic expressions"""
-        if self.check("tok_chiffre"):
-            token = self.accept("tok_chiffre")
-            return create_node(ND_CONST, valeur=token[1])
-
-        if self.check("tok_lparen"):
-            self.accept("tok_lparen")
-            expr = self.parse_expression()
-            self.accept("tok_rparen")
-            return expr
+            while token[0] in UNARY_OPS:
+                self.accept(token[0])
+                if UNARY_OPS[token[0]] is not None:
+                    ops.append(("un", UNARY_OPS[token[0]]))
+                token = self.lexer.peek()
 
-        if self.check("tok_identifiant"):
-            token = self.accept("tok_identifiant")
-            # --- Vérifie si c'est un appel de fonction ---
-            if self.check("tok_lparen"):
+            if token[0] == "tok_lparen":
                 self.accept("tok_lparen")
-                args = []
-                if not self.check("tok_rparen"):
-                    while True:
-                        args.append(self.parse_expression())
-                        if self.check("tok_rparen"):
-                            break
-                        self.accept("tok_comma")
-                self.accept("tok_rparen")
-
-                func_node = create_node(ND_FUNC_CALL, chaine=token[1])
-                for a in args:
-                    func_node.ajouter_enfant(a)
-                return func_node
-            #Check for array access
-            if self.check("tok_lbrack"):
-                self.accept("tok_lbrack")
-                index_expr=self.parse_expression()
-                self.accept("tok_rbrack")
-
-                ident_node=create_node(ND_IDENT, chaine=token[1])
-                return create_node(ND_ARRAY_ACCESS, children=[ident_node, index_expr])
-            
-            return create_node(ND_IDENT, chaine=token[1])
-
-        if self.check("tok_motscle"):
-            token = self.lexer.peek()
-            if token[1] in ["True", "False"]:
+                ops.append(("paren",))
+                depth += 1
+                continue
+            if token[0] == "tok_chiffre":
+                self.accept("tok_chiffre")
+                values.append(create_node(ND_CONST, valeur=token[1]))
+            elif token[0] == "tok_identifiant":
+                self.accept("tok_identifiant")
+                # --- Vérifie si c'est un appel de fonction ---
+                if self.check("tok_lparen"):
+                    self.accept("tok_lparen")
+                    if not self.check("tok_rparen"):
+                        ops.append(("call", token[1], len(values)))
+                        depth += 1
+                        continue
+                    self.accept("tok_rparen")
+                    values.append(create_node(ND_FUNC_CALL, chaine=token[1]))
+                #Check for array access
+                elif self.check("tok_lbrack"):
+                    self.accept("tok_lbrack")
+                    ops.append(("index", token[1]))
+                    depth += 1
+                    continue
+                else:
+                    values.append(create_node(ND_IDENT, chaine=token[1]))
+            elif token[0] == "tok_motscle" and token[1] in ["True", "False"]:
                 self.accept("tok_motscle")
                 valeur = 1 if token[1] == "True" else 0
-                return create_node(ND_CONST, valeur=valeur)
+                values.append(create_node(ND_CONST, valeur=valeur))
+            else:
+                raise SyntaxError(f"Expected expression, got: {token[0]} at line {self.lexer.line}")
+
+            # --- Operators after a complete operand ---
+            while True:
+                while ops and ops[-1][0] == "un":
+                    values.append(create_node(ops.pop()[1], children=[values.pop()]))
+                if primary and not depth:
+                    return values.pop()
+
+                tok_type = self.lexer.peek()[0]
+                if tok_type in BINOPS and (depth or BINOPS[tok_type][0] >= min_prio):
+                    prec, assoc, nd_type = BINOPS[tok_type]
+                    self._reduce(values, ops, prec)
+                    self.accept(tok_type)
+                    next_min = prec if assoc == "R" else prec + 1
+                    ops.append(("bin", next_min, nd_type))
+                    break   # right operand
+
+                if not depth:
+                    self._reduce(values, ops)
+                    return values.pop()
+
+                # Inside a group: argument separator or closing token
+                self._reduce(values, ops)
+                group = ops[-1]
+                if group[0] == "call" and tok_type == "tok_comma":
+                    self.accept("tok_comma")
+                    break   # next argument
+                ops.pop()
+                depth -= 1
+                if group[0] == "paren":
+                    self.accept("tok_rparen")
+                elif group[0] == "call":
+                    self.accept("tok_rparen")
+                    args = values[group[2]:]
+                    del values[group[2]:]
+                    values.append(create_node(ND_FUNC_CALL, chaine=group[1], children=args))
+                else:
+                    self.accept("tok_rbrack")
+                    ident_node = create_node(ND_IDENT, chaine=group[1])
+                    values.append(create_node(ND_ARRAY_ACCESS, children=[ident_node, values.pop()]))
+
+    def _reduce(self, values, ops, prec=None):
+        """Build the pending binary operators that bind tighter than prec"""
+        while ops and ops[-1][0] == "bin" and (prec is None or ops[-1][1] > prec):
+            _, _, nd_type = ops.pop()
+            right = values.pop()
+            left = values.pop()
+            values.append(create_node(nd_type, children=[left, right]))
 
-        token = self.lexer.peek()
-        raise SyntaxError(f"Expected expression, got: {token[0]} at line {self.lexer.line}")
+    def parse_primary(self):
+        """Parse primary expressions (unary operators and atoms)"""
+        return self.parse_expression(primary=True)
 
     def parse_instruction(self):
         """Parse instructions"""
@@ -321,6 +405,35 @@ class Parser:
             
             return create_node(ND_DOWHILE, children=[body, condition])
 
+        # Switch statement: case/default markers among the body statements
+        if self.check("tok_motscle") and self.lexer.peek()[1] == "switch":
+            self.accept("tok_motscle")
+            self.accept("tok_lparen")
+            expr = self.parse_expression()
+            self.accept("tok_rparen")
+            self.accept("tok_lcurly")
+            body = create_node(ND_BLOCK)
+            while not self.check("tok_rcurly"):
+                token = self.lexer.peek()
+                if token == ("tok_motscle", "case"):
+                    self.accept("tok_motscle")
+                    value = self.parse_expression()
+                    self.accept("tok_colon")
+                    body.ajouter_enfant(create_node(ND_CASE, children=[value]))
+                elif token == ("tok_motscle", "default"):
+                    self.accept("tok_motscle")
+                    self.accept("tok_colon")
+                    body.ajouter_enfant(create_node(ND_DEFAULT))
+                else:
+                    body.ajouter_enfant(self.parse_instruction())
+            self.accept("tok_rcurly")
+            return create_node(ND_SWITCH, children=[expr, body])
+
+        if self.check("tok_motscle") and self.lexer.peek()[1] == "break":
+            self.accept("tok_motscle")
+            self.accept("tok_semicolon")
+            return create_node(ND_BREAK)
+
         # Return statement
         if self.check("tok_motscle") and self.lexer.peek()[1] == "return":
             self.accept("tok_motscle")
@@ -328,8 +441,9 @@ class Parser:
             self.accept("tok_semicolon")
             return create_node(ND_RETURN, children=[expr])
 
-        # Assignment or expression statement
-        if self.check("tok_identifiant"):
+        # Assignment: decided on the token after the identifier, anything
+        # else (call, x + 1, ...) falls through to the expression statement
+        if self.check("tok_identifiant") and self.lexer.peek_at(1)[0] in ("tok_egal", "tok_lbrack"):
             var_token = self.accept("tok_identifiant")
             
             # Check for array assignment: arr[index] = value;
@@ -344,39 +458,12 @@ class Parser:
                 ident_node = create_node(ND_IDENT, chaine=var_token[1])
                 return create_node(ND_ARRAY_ASSIGN, children=[ident_node, index_expr, value_expr])
             
-            # Check for regular assignment: ident = value;
-            if self.check("tok_egal"):
-                self.accept("tok_egal")
-                expr = self.parse_expression()
-                self.accept("tok_semicolon")
-                ident_node = create_node(ND_IDENT, chaine=var_token[1])
-                return create_node(ND_ASSIGN, children=[ident_node, expr])
-            
-            # Expression statement (likely function call or standalone identifier)
-            # Put it back and parse as expression
-            # Since we already consumed it, check if there's more
-            if self.check("tok_lparen"):
-                # It's a function call as a statement
-                self.accept("tok_lparen")
-                args = []
-                if not self.check("tok_rparen"):
-                    while True:
-                        args.append(self.parse_expression())
-                        if self.check("tok_rparen"):
-                            break
-                        self.accept("tok_comma")
-                self.accept("tok_rparen")
-                self.accept("tok_semicolon")
-                
-                node = create_node(ND_FUNC_CALL, chaine=var_token[1])
-                for a in args:
-                    node.ajouter_enfant(a)
-                return create_node(ND_DROP, children=[node])
-            
-            # Just an identifier as a statement
+            # Regular assignment: ident = value;
+            self.accept("tok_egal")
+            expr = self.parse_expression()
             self.accept("tok_semicolon")
             ident_node = create_node(ND_IDENT, chaine=var_token[1])
-            return create_node(ND_DROP, children=[ident_node])
+            return create_node(ND_ASSIGN, children=[ident_node, expr])
 
         # Add handling for dereference assignment: *ptr = value;
         if self.check("tok_star"):
@@ -476,11 +563,30 @@ class Parser:
                 else:
                     return create_node(ND_DECL, chaine=ident_name)
 
+    def parse_program(self):
+        """Parse top-level items until the end of the input
+
+        A single statement that needs no storage is returned as is; several
+        items, a function definition or a statement that declares variables
+        give an ND_PROGRAM node, which reserves the top-level frame. Each function gets a token_hash
+        of its token stream, used to reuse its code when it did not change.
+        """
+        items = []
+        while not self.check("tok_EOF"):
+            first = self.lexer.mark()
+            item = self.parse_instruction()
+            if item.type == ND_FUNC_DECL:
+                item.token_hash = self.lexer.fingerprint(first, self.lexer.mark())
+            items.append(item)
+        if len(items) == 1 and items[0].type not in PROGRAM_ITEMS:
+            return items[0]
+        return create_node(ND_PROGRAM, children=items)
+
 def parse(source_code):
     """Parse source code and return AST"""
-    lexer = Lexer(source_code)
+    lexer = BulkLexer(source_code)
     parser = Parser(lexer)
-    ast = parser.parse_instruction()
+    ast = parser.parse_program()
     return ast
 
 if __name__ == "__main__":
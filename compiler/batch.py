@@ -0,0 +1,96 @@
+"""
+Compilation par lots sur plusieurs processus.
+
+Chaque fichier est compilé dans un processus du pool avec son propre
+CompilationContext ; les erreurs sont collectées et rapportées ensemble à la
+fin au lieu d'arrêter le lot au premier échec.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from analyse_semantique import compile_code
+from cache import CompilationCache, DEFAULT_CACHE_SIZE
+from optimisation import INLINE_BUDGET
+
+
+def read_manifest(path):
+    """Lit un manifeste : une entrée par ligne, 'source [sortie]', # pour commenter
+
+    Les chemins relatifs sont pris par rapport au répertoire du manifeste.
+    """
+    base = os.path.dirname(os.path.abspath(path))
+    jobs = []
+    with open(path, 'r') as f:
+        for line in f:
+            line = line.split("#", 1)[0].strip()
+            if not line:
+                continue
+            parts = line.split()
+            if len(parts) > 2:
+                raise ValueError(f"Invalid manifest line: {line!r}")
+            source = os.path.join(base, parts[0])
+            output = os.path.join(base, parts[1]) if len(parts) == 2 else None
+            jobs.append((source, output))
+    return jobs
+
+
+def default_output(source, out_dir=None, suffix=".s"):
+    """foo.c -> foo.s (ou foo.o avec suffix=".o"), dans out_dir si donné"""
+    name = os.path.splitext(source)[0] + suffix
+    if out_dir:
+        name = os.path.join(out_dir, os.path.basename(name))
+    return name
+
+
+def compile_file(source, output, opt_level=1, cache_dir=None, cache_size=DEFAULT_CACHE_SIZE,
+                 object_code=False, inline_budget=INLINE_BUDGET):
+    """Compile un fichier, renvoie (source, sortie, erreur ou None, stats)"""
+    try:
+        with open(source, 'r') as f:
+            source_code = f.read()
+        cache = CompilationCache(cache_dir, cache_size) if cache_dir else None
+        result = compile_code(source_code, output_file=output, verbose=False,
+                              opt_level=opt_level, cache=cache, object_code=object_code,
+                              inline_budget=inline_budget)
+        return source, output, None, result.stats
+    except Exception as e:
+        return source, output, f"{type(e).__name__}: {e}", None
+
+
+def compile_batch(jobs, workers=None, opt_level=1, cache_dir=None, cache_size=DEFAULT_CACHE_SIZE,
+                  object_code=False, inline_budget=INLINE_BUDGET):
+    """Compile [(source, sortie)] sur un pool de processus
+
+    Renvoie la liste des résultats de compile_file, dans l'ordre des jobs.
+    object_code : des objets pour linker.py au lieu de programmes complets.
+    """
+    if workers == 1 or len(jobs) <= 1:
+        return [compile_file(source, output, opt_level, cache_dir, cache_size, object_code,
+                             inline_budget)
+                for source, output in jobs]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(compile_file, source, output, opt_level, cache_dir, cache_size,
+                               object_code, inline_budget)
+                   for source, output in jobs]
+        return [future.result() for future in futures]
+
+
+def format_report(results):
+    """Rapport combiné : une ligne par erreur puis un résumé"""
+    errors = [(source, error) for source, _, error, _ in results if error is not None]
+    lines = [f"{source}: {error}" for source, error in errors]
+    lines.append(f"{len(results)} file(s) compiled, {len(results) - len(errors)} succeeded, {len(errors)} failed")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as d:
+        jobs = []
+        for i, source in enumerate(["debug 1;", "{ int x; x = 2; debug x; }", "debug (;"]):
+            path = os.path.join(d, f"f{i}.c")
+            with open(path, 'w') as f:
+                f.write(source)
+            jobs.append((path, default_output(path)))
+        print(format_report(compile_batch(jobs, workers=2)))
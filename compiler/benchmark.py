@@ -0,0 +1,346 @@
+"""
+Banc d'essai du compilateur : débit de chaque phase selon la taille du source.
+
+Les programmes sont produits par un générateur aléatoire à graine fixe qui
+couvre la grammaire acceptée (fonctions, tableaux, pointeurs, for, while,
+do-while, if/else, switch, && et ||, appels). Pour chaque taille, chaque phase est
+chronométrée séparément par les hooks de compile_code (meilleur temps sur
+plusieurs répétitions) :
+
+    lexer      tokenize (BulkLexer)
+    parser     Parser.parse_program
+    semantic   SemanticAnalyzer
+    optimize   fold_constants + eliminate_dead_code  (-O1)
+    codegen    CodeGenerator
+    cfg        build_cfg + run_passes + linearize        (-O1)
+    peephole   peephole.optimize                     (-O1)
+    stack      analyze_stack
+
+Les résultats sont écrits en JSON et comparés à une référence enregistrée :
+une phase régresse quand son temps dépasse celui de la référence de plus de
+--threshold. Le tableau donne aussi l'exposant de croissance entre deux
+tailles successives (1.0 = linéaire), signalé au-delà de 1 + threshold.
+
+    python benchmark.py --sizes 1K,100K,1M --save-baseline
+    python benchmark.py --sizes 1K,100K,1M
+"""
+import argparse
+import gc
+import json
+import math
+import os
+import platform
+import random
+import sys
+
+from analyse_semantique import compile_code, COMPILER_VERSION
+
+DEFAULT_SIZES = "1K,10K,100K,1M,10M,50M"
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json")
+PHASES = ["lexer", "parser", "semantic", "optimize", "codegen", "cfg", "peephole", "stack"]
+MIN_TIME = 0.005   # temps en dessous duquel les comparaisons sont du bruit
+
+
+# --- Générateur de programmes ---
+
+class ProgramGenerator:
+    """
+    Programmes aléatoires valides pour le compilateur. Chaque fonction
+    n'appelle que des fonctions définies avant elle (pas de récursion) et ne
+    divise que par des constantes non nulles ; les boucles sont bornées.
+    """
+    ARRAY_SIZE = 8
+    COMPARISONS = ["<", ">", "<=", ">=", "==", "!="]
+    ARITHMETIC = ["+", "-", "*", "+", "-"]
+
+    def __init__(self, seed=0):
+        self.rng = random.Random(seed)
+        self.functions = []   # [(nom, nombre de paramètres)]
+
+    def program(self, size):
+        """Source d'environ size octets (au moins une fonction et main)"""
+        parts = []
+        total = 0
+        while total < size or not self.functions:
+            text = self.function()
+            parts.append(text)
+            total += len(text) + 1
+        calls = self.rng.sample(self.functions, min(3, len(self.functions)))
+        body = "".join(f"    debug {self.call(name, arity, ['1', '2', '3'])} + 48;\n"
+                       for name, arity in calls)
+        parts.append("int main() {\n" + body + "    return 0;\n}\n")
+        return "\n".join(parts)
+
+    def function(self):
+        rng = self.rng
+        name = f"f{len(self.functions)}"
+        params = [f"a{i}" for i in range(rng.randint(1, 3))]
+        self.scalars = params + ["x", "y", "z"]
+        self.loop_vars = 0
+        lines = ["int x;", "int y;", "int z;", f"int t[{self.ARRAY_SIZE}];", "int *p;",
+                 "x = 0;", "y = 1;", "z = 2;", "p = &x;",
+                 # resn does not clear the frame: every read must follow a write
+                 f"for (int k = 0; k < {self.ARRAY_SIZE}; k = k + 1) {{ t[k] = k; }}"]
+        for _ in range(rng.randint(4, 10)):
+            lines.extend(self.statement(depth=0))
+        lines.append(f"return {self.expression(2)};")
+        self.functions.append((name, len(params)))
+        header = f"int {name}(" + ", ".join(f"int {p}" for p in params) + ") {\n"
+        return header + "".join(f"    {line}\n" for line in lines) + "}\n"
+
+    def statement(self, depth):
+        """Liste de lignes pour une instruction"""
+        rng = self.rng
+        kind = rng.choice(["assign", "assign", "array", "pointer", "debug",
+                           "if", "for", "while", "dowhile", "switch"] if depth < 2 else
+                          ["assign", "array", "pointer", "debug"])
+        if kind == "assign":
+            return [f"{rng.choice(self.scalars)} = {self.expression(3)};"]
+        if kind == "array":
+            return [f"t[{rng.randrange(self.ARRAY_SIZE)}] = {self.expression(3)};"]
+        if kind == "pointer":
+            return [f"p = &{rng.choice(self.scalars)};", f"*p = {self.expression(2)};"]
+        if kind == "debug":
+            return [f"debug {self.expression(3)};"]
+        if kind == "if":
+            lines = [f"if ({self.condition()}) {{"] + self.block(depth)
+            if rng.random() < 0.5:
+                lines += ["} else {"] + self.block(depth)
+            return lines + ["}"]
+        if kind == "switch":
+            return self.switch(depth)
+        var = f"i{self.loop_vars}"
+        self.loop_vars += 1
+        bound = rng.randint(1, self.ARRAY_SIZE)
+        if kind == "for":
+            body = self.block(depth) + [f"    t[{var}] = t[{var}] + {self.expression(1)};"]
+            return [f"for (int {var} = 0; {var} < {bound}; {var} = {var} + 1) {{"] + body + ["}"]
+        step = [f"    {var} = {var} + 1;"]
+        if kind == "while":
+            return ([f"{{ int {var}; {var} = 0;", f"while ({var} < {bound} && {self.condition()} || {var} == 0) {{"]
+                    + self.block(depth) + step + ["} }"])
+        return ([f"{{ int {var}; {var} = 0;", "do {"]
+                + self.block(depth) + step + [f"}} while ({var} < {bound});", "}"])
+
+    def switch(self, depth):
+        """switch dense ou creux, avec ou sans default, break ou chute"""
+        rng = self.rng
+        spread = rng.choice([1, 1, 7])
+        values = sorted(rng.sample(range(-4, 12 * spread), rng.randint(1, 6)))
+        lines = [f"switch ({self.expression(2)}) {{"]
+        for value in values:
+            lines += [f"case {value}:"] + self.block(depth)
+            if rng.random() < 0.7:
+                lines.append("    break;")
+        if rng.random() < 0.5:
+            lines += ["default:"] + self.block(depth)
+        return lines + ["}"]
+
+    def block(self, depth):
+        lines = []
+        for _ in range(self.rng.randint(1, 3)):
+            lines.extend(self.statement(depth + 1))
+        return ["    " + line for line in lines]
+
+    def condition(self):
+        rng = self.rng
+        cond = f"{self.expression(2)} {rng.choice(self.COMPARISONS)} {self.expression(2)}"
+        if rng.random() < 0.3:
+            cond += f" {rng.choice(['&&', '||'])} !({self.expression(1)} {rng.choice(self.COMPARISONS)} {self.expression(1)})"
+        return cond
+
+    def expression(self, depth):
+        rng = self.rng
+        if depth <= 0 or rng.random() < 0.25:
+            r = rng.random()
+            if r < 0.35:
+                return str(rng.randint(0, 100))
+            if r < 0.75:
+                return rng.choice(self.scalars)
+            if r < 0.9:
+                return f"t[{rng.randrange(self.ARRAY_SIZE)}]"
+            return "*p"
+        r = rng.random()
+        if r < 0.1 and self.functions:
+            name, arity = rng.choice(self.functions[-8:])
+            return self.call(name, arity, [self.expression(depth - 1) for _ in range(arity)])
+        if r < 0.2:
+            return f"{self.expression(depth - 1)} / {rng.randint(1, 9)}"
+        if r < 0.3:
+            return f"-({self.expression(depth - 1)})"
+        if r < 0.4:
+            return f"({self.expression(depth - 1)} {rng.choice(self.COMPARISONS)} {self.expression(depth - 1)})"
+        return f"({self.expression(depth - 1)} {rng.choice(self.ARITHMETIC)} {self.expression(depth - 1)})"
+
+    def call(self, name, arity, args):
+        return f"{name}({', '.join(args[:arity])})"
+
+
+def generate_program(size, seed=0):
+    """Programme aléatoire d'environ size octets, reproductible par graine"""
+    return ProgramGenerator(seed).program(size)
+
+
+# --- Mesures ---
+
+def run_phases(source, opt_level=1):
+    """Compile source, renvoie ({phase: secondes}, compteurs)"""
+    events = []
+    compile_code(source, verbose=False, opt_level=opt_level, hooks=[events.append])
+    times = {e["phase"]: e["seconds"] for e in events if e["event"] == "phase"}
+    summary = events[-1]
+    counts = {key: summary[key] for key in ("tokens", "nodes", "instructions")}
+    return times, counts
+
+
+def measure(size, seed=0, repeat=3, opt_level=1):
+    """Meilleur temps de chaque phase sur repeat compilations"""
+    source = generate_program(size, seed)
+    best = {}
+    for _ in range(repeat):
+        gc.collect()
+        times, counts = run_phases(source, opt_level)
+        for phase, seconds in times.items():
+            best[phase] = min(seconds, best.get(phase, seconds))
+    result = {"size": len(source), "lines": source.count("\n"), "phases": best}
+    result.update(counts)
+    return result
+
+
+def run_benchmark(sizes, seed=0, repeat=3, opt_level=1, progress=None):
+    results = []
+    for size in sizes:
+        result = measure(size, seed, repeat, opt_level)
+        results.append(result)
+        if progress:
+            progress(result)
+    return {
+        "compiler_version": COMPILER_VERSION,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "seed": seed,
+        "repeat": repeat,
+        "opt_level": opt_level,
+        "results": results,
+    }
+
+
+# --- Comparaison ---
+
+def scaling_exponents(results):
+    """{(taille, phase): exposant de croissance depuis la taille précédente}"""
+    exponents = {}
+    for prev, cur in zip(results, results[1:]):
+        for phase, seconds in cur["phases"].items():
+            before = prev["phases"].get(phase)
+            if before is None or before < MIN_TIME or cur["size"] <= prev["size"]:
+                continue
+            exponents[(cur["size"], phase)] = (math.log(seconds / before)
+                                               / math.log(cur["size"] / prev["size"]))
+    return exponents
+
+
+def compare(report, baseline, threshold):
+    """Régressions par rapport à baseline : [(taille, phase, ratio)]
+
+    Les tailles sont appariées dans l'ordre (même graine, mêmes tailles
+    demandées, donc mêmes sources).
+    """
+    regressions = []
+    for cur, ref in zip(report["results"], baseline["results"]):
+        if cur["size"] != ref["size"]:
+            continue
+        for phase, seconds in cur["phases"].items():
+            before = ref["phases"].get(phase)
+            if before is None or max(before, seconds) < MIN_TIME:
+                continue
+            ratio = seconds / max(before, MIN_TIME)
+            if ratio > 1 + threshold:
+                regressions.append((cur["size"], phase, ratio))
+    return regressions
+
+
+def format_table(report, baseline=None, threshold=0.25):
+    """Tableau : temps par phase, débit, exposant et ratio à la référence"""
+    exponents = scaling_exponents(report["results"])
+    refs = {}
+    if baseline is not None:
+        refs = {ref["size"]: ref for ref in baseline["results"]}
+    lines = [f"{'size':>10} {'phase':<9} {'time (s)':>9} {'MB/s':>8} {'growth':>7} {'vs base':>8}"]
+    for result in report["results"]:
+        size = result["size"]
+        for phase in PHASES:
+            if phase not in result["phases"]:
+                continue
+            seconds = result["phases"][phase]
+            rate = size / seconds / 1e6 if seconds > 0 else float("inf")
+            growth = exponents.get((size, phase))
+            growth_text = "" if growth is None else f"{growth:.2f}" + ("!" if growth > 1 + threshold else " ")
+            ratio_text = ""
+            ref = refs.get(size, {}).get("phases", {}).get(phase)
+            if ref:
+                ratio = seconds / ref
+                ratio_text = f"{ratio:.2f}" + ("!" if ratio > 1 + threshold and seconds >= MIN_TIME else " ")
+            lines.append(f"{size:>10} {phase:<9} {seconds:>9.4f} {rate:>8.2f} {growth_text:>7} {ratio_text:>8}")
+        lines.append(f"{'':>10} {result['lines']} lines, {result['tokens']} tokens, "
+                     f"{result['nodes']} nodes, {result['instructions']} instructions")
+    return "\n".join(lines)
+
+
+def parse_size(text):
+    """'512', '10K', '50M' -> octets"""
+    units = {"K": 1024, "M": 1024 * 1024}
+    text = text.strip().upper()
+    if text and text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compiler throughput benchmark')
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help='Comma-separated source sizes (default: %(default)s)')
+    parser.add_argument('--seed', type=int, default=0, help='Program generator seed (default: %(default)s)')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per size, the best time is kept (default: %(default)s)')
+    parser.add_argument('-O', dest='opt_level', type=int, default=1, help='Optimization level (default: %(default)s)')
+    parser.add_argument('--output', help='Write the results as JSON to this file')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='Baseline JSON to compare with (default: %(default)s)')
+    parser.add_argument('--save-baseline', action='store_true', help='Store the results as the new baseline')
+    parser.add_argument('--threshold', type=float, default=0.25, help='Allowed slowdown vs the baseline, and growth above linear (default: %(default)s)')
+    parser.add_argument('--emit', metavar='SIZE', help='Print a generated program of this size and exit')
+    args = parser.parse_args()
+
+    if args.emit:
+        sys.stdout.write(generate_program(parse_size(args.emit), args.seed))
+        return 0
+
+    sizes = [parse_size(s) for s in args.sizes.split(",") if s.strip()]
+    report = run_benchmark(sizes, args.seed, args.repeat, args.opt_level,
+                           progress=lambda r: print(f"{r['size']} bytes: "
+                                                    f"{sum(r['phases'].values()):.3f}s", file=sys.stderr))
+
+    baseline = None
+    if not args.save_baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print(format_table(report, baseline, args.threshold))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+    if baseline is None:
+        print(f"No baseline at {args.baseline} (use --save-baseline)")
+        return 0
+
+    regressions = compare(report, baseline, args.threshold)
+    for size, phase, ratio in regressions:
+        print(f"REGRESSION: {phase} at {size} bytes is {ratio:.2f}x the baseline")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,158 @@
+"""
+Cache de compilation sur disque, adressé par contenu.
+
+La clé est un hash SHA-256 du texte source, de la version du compilateur et
+des options qui influent sur le résultat. Chaque entrée est le fichier .s
+produit, rangé dans un sous-répertoire nommé d'après les deux premiers
+caractères de la clé. Les écritures passent par un fichier temporaire puis
+os.replace, ce qui est atomique même si plusieurs compilations partagent le
+répertoire. La date de modification sert d'horodatage LRU : elle est mise à
+jour à chaque succès et les entrées les plus anciennes sont supprimées quand
+la taille totale dépasse max_bytes.
+"""
+import hashlib
+import json
+import os
+import tempfile
+
+DEFAULT_CACHE_SIZE = 64 * 1024 * 1024
+ENTRY_SUFFIX = ".s"
+
+
+class CompilationCache:
+    """
+    Cache de fichiers .s :
+      - key(source, options) : clé d'une compilation
+      - get(key)             : texte stocké ou None
+      - put(key, text)       : stocke une entrée (écriture atomique)
+      - stats()              : succès, échecs, évictions, taille
+    """
+    def __init__(self, directory, max_bytes=DEFAULT_CACHE_SIZE):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self._size = None   # taille totale estimée, calculée au premier put
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(source_code, options):
+        """Hash du source et des options (dictionnaire sérialisable en JSON)"""
+        h = hashlib.sha256()
+        h.update(json.dumps(options, sort_keys=True).encode())
+        h.update(b"\0")
+        h.update(source_code.encode())
+        return h.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key + ENTRY_SUFFIX)
+
+    def get(self, key):
+        """Renvoie le texte stocké pour key, ou None"""
+        path = self._path(key)
+        try:
+            with open(path, 'r') as f:
+                text = f.read()
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        try:
+            os.utime(path)   # entrée récemment utilisée
+        except FileNotFoundError:
+            pass             # évincée entre-temps par un autre processus
+        self.hits += 1
+        return text
+
+    def put(self, key, text):
+        """Stocke text sous key puis évince si le cache est trop gros"""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(text)
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except FileNotFoundError:
+                pass
+            raise
+        self.stores += 1
+
+        if self._size is None:
+            self._size = sum(size for _, size, _ in self._entries())
+        else:
+            self._size += len(text.encode())
+        if self._size > self.max_bytes:
+            self._evict()
+
+    def _entries(self):
+        """[(chemin, taille, mtime)] de toutes les entrées"""
+        entries = []
+        try:
+            shards = list(os.scandir(self.directory))
+        except FileNotFoundError:
+            return entries
+        for shard in shards:
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if not entry.name.endswith(ENTRY_SUFFIX):
+                    continue
+                try:
+                    st = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((entry.path, st.st_size, st.st_mtime))
+        return entries
+
+    def _evict(self):
+        """Supprime les entrées les moins récemment utilisées"""
+        entries = sorted(self._entries(), key=lambda e: e[2])
+        total = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.unlink(path)
+                self.evictions += 1
+            except FileNotFoundError:
+                pass
+            total -= size
+        self._size = total
+
+    def clear(self):
+        for path, _, _ in self._entries():
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+        self._size = 0
+
+    def stats(self):
+        entries = self._entries()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "entries": len(entries),
+            "bytes": sum(size for _, size, _ in entries),
+        }
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as d:
+        cache = CompilationCache(d, max_bytes=64)
+        k1 = cache.key("debug 1;", {"opt_level": 1})
+        print(cache.get(k1))
+        cache.put(k1, ".start\npush 1\nsend\nhalt\n.end\n")
+        print(cache.get(k1), end="")
+        for i in range(5):
+            cache.put(cache.key(f"debug {i};", {}), f".start\npush {i}\nsend\nhalt\n.end\n")
+        print(cache.stats())
@@ -0,0 +1,435 @@
+"""
+Représentation intermédiaire en blocs de base (graphe de flot de contrôle).
+
+Le générateur de code traduit l'arbre en une liste d'instructions ; build_cfg
+la découpe en blocs de base, suites d'instructions sans étiquette ni saut au
+milieu, reliés par des successeurs explicites selon leur sortie :
+
+    jump L          un successeur : target
+    jumpt/jumpf L   target (branche prise) et next (sinon)
+    ret, halt       aucun
+    (aucune)        next, le bloc qui suivait dans le code
+
+Les passes de CFG_PASSES réécrivent le graphe sans se soucier de l'ordre
+des blocs ; linearize le remet à plat dans l'ordre choisi par la
+disposition, en n'écrivant que les sauts et les étiquettes nécessaires.
+
+Les racines sont les points d'entrée : start, end et les fonctions nommées
+par un prep. Elles gardent leur étiquette, et un bloc qu'aucun chemin depuis
+une racine n'atteint disparaît (avec lui, une fonction jamais appelée).
+"""
+from emetteur import OP_LABEL, OP_DROP, OP_JUMP, OP_JUMPT, OP_JUMPF, OP_PREP, OP_RET, OP_HALT
+
+# Sorties de bloc
+BRANCHES = (OP_JUMPT, OP_JUMPF)
+JUMPS = (OP_JUMP, OP_JUMPT, OP_JUMPF)
+TERMINATORS = (OP_JUMP, OP_JUMPT, OP_JUMPF, OP_RET, OP_HALT)
+
+# Instructions où build_cfg s'arrête (prep : point d'entrée d'une fonction)
+BOUNDARIES = frozenset((OP_LABEL, OP_PREP) + TERMINATORS)
+
+# Étiquettes toujours conservées (en plus des fonctions appelées)
+ENTRY_LABELS = ("start", "end")
+
+# Fréquence estimée d'un bloc : LOOP_WEIGHT ** profondeur de boucle
+LOOP_WEIGHT = 10
+
+FLIPPED = {OP_JUMPT: OP_JUMPF, OP_JUMPF: OP_JUMPT}
+
+
+class Block:
+    """
+    Bloc de base :
+      - names  : étiquettes définies au début du bloc (la première nomme les sauts)
+      - code   : instructions, sans étiquette ni saut
+      - exit   : jump, jumpt, jumpf, ret, halt ou None (passe au bloc suivant)
+      - target : bloc visé par le saut de sortie
+      - next   : bloc suivant pour None et jumpt/jumpf
+      - index  : position dans le code d'origine (boucles, ordre stable)
+    """
+    __slots__ = ("names", "code", "exit", "target", "next", "index")
+
+    def __init__(self, names, index):
+        self.names = names
+        self.code = []
+        self.exit = None
+        self.target = None
+        self.next = None
+        self.index = index
+
+    def successors(self):
+        """Blocs atteints depuis la sortie (cible d'abord)"""
+        return [block for block in (self.target, self.next) if block is not None]
+
+    def is_empty(self):
+        """True pour un bloc sans instruction qui mène à un seul successeur"""
+        return not self.code and self.exit in (None, OP_JUMP)
+
+    def __repr__(self):
+        name = self.names[0] if self.names else f"#{self.index}"
+        return f"Block({name}, {len(self.code)} instructions)"
+
+
+class CFG:
+    """Blocs de base d'un programme et ses racines, dans l'ordre du code"""
+    def __init__(self, blocks, roots, entries):
+        self.blocks = blocks     # [Block]
+        self.roots = roots       # [Block] : start, fonctions appelées, end
+        self.entries = entries   # {étiquette d'une racine}, toujours écrite
+
+    def predecessors(self):
+        """{bloc: nombre d'arcs qui y mènent}"""
+        counts = {}
+        for block in self.blocks:
+            for successor in (block.target, block.next):
+                if successor is not None:
+                    counts[successor] = counts.get(successor, 0) + 1
+        return counts
+
+
+def build_cfg(code, entries=()):
+    """Découpe une liste d'instructions en blocs de base reliés
+
+    entries : étiquettes à garder comme racines en plus de start, end et des
+    cibles de prep (fonctions d'un objet appelées depuis d'autres objets).
+    """
+    blocks = []
+    by_label = {}
+    entries = set(ENTRY_LABELS).union(entries)
+    block = None
+    start = 0   # code[start:i] : instructions ordinaires pas encore rangées
+    for i, (op, arg) in enumerate(code):
+        if op not in BOUNDARIES:
+            continue
+        if op == OP_PREP:
+            entries.add(arg)
+            continue
+        if start < i:
+            if block is None or block.exit is not None:
+                block = _new_block(blocks)
+            block.code.extend(code[start:i])
+        start = i + 1
+        if op == OP_LABEL:
+            if block is None or block.code or block.exit is not None:
+                block = _new_block(blocks)
+            block.names.append(arg)
+            by_label[arg] = block
+        else:
+            if block is None or block.exit is not None:
+                block = _new_block(blocks)
+            block.exit = op
+            if op in JUMPS:
+                block.target = arg
+    if start < len(code):
+        if block is None or block.exit is not None:
+            block = _new_block(blocks)
+        block.code.extend(code[start:])
+
+    for i, block in enumerate(blocks):
+        if block.target is not None:
+            block.target = by_label[block.target]
+        if block.exit in (None, OP_JUMPT, OP_JUMPF) and i + 1 < len(blocks):
+            block.next = blocks[i + 1]
+
+    roots = sorted({by_label[name] for name in entries if name in by_label},
+                   key=lambda root: root.index)
+    return CFG(blocks, roots, entries)
+
+
+def _new_block(blocks):
+    block = Block([], len(blocks))
+    blocks.append(block)
+    return block
+
+
+# --- Passes ---
+
+def remove_empty_blocks(cfg):
+    """Retire les blocs vides (sans instruction, qui ne font que passer la main)
+
+    Les arcs qui y mènent vont directement à la destination finale de la
+    suite de blocs vides. Renvoie le nombre de blocs retirés.
+    """
+    for block in cfg.blocks:
+        for field in ("target", "next"):
+            successor = getattr(block, field)
+            if successor is not None and successor.is_empty():
+                setattr(block, field, _destination(successor))
+    used = set(cfg.roots)
+    used.update(cfg.predecessors())
+    before = len(cfg.blocks)
+    cfg.blocks = [block for block in cfg.blocks if block in used or not block.is_empty()]
+    return before - len(cfg.blocks)
+
+
+def thread_jumps(cfg):
+    """Court-circuite les sauts qui ne mènent qu'à un autre saut
+
+    Un jump vers un bloc vide qui se termine par ret ou halt devient ce ret
+    ou ce halt. Un jumpt/jumpf dont les deux branches mènent au même bloc
+    n'est plus qu'un drop 1. Renvoie le nombre de sauts modifiés.
+    """
+    changed = 0
+    for block in cfg.blocks:
+        if (block.exit == OP_JUMP and not block.target.code
+                and block.target.exit in (OP_RET, OP_HALT)):
+            block.exit = block.target.exit
+            block.target = None
+            changed += 1
+        elif block.exit in BRANCHES and block.target is block.next:
+            block.code.append((OP_DROP, 1))   # la condition est quand même dépilée
+            block.exit = None
+            block.target = None
+            changed += 1
+    return changed
+
+
+def _destination(block):
+    """Premier bloc non vide au bout d'une suite de blocs vides"""
+    seen = set()
+    while block.is_empty() and block not in seen:
+        seen.add(block)
+        successor = block.target if block.exit == OP_JUMP else block.next
+        if successor is None:
+            break
+        block = successor
+    return block
+
+
+def remove_unreachable(cfg):
+    """Retire les blocs qu'aucun chemin depuis une racine n'atteint
+
+    Renvoie le nombre de blocs retirés.
+    """
+    reached = set()
+    stack = list(cfg.roots)
+    while stack:
+        block = stack.pop()
+        if block in reached:
+            continue
+        reached.add(block)
+        stack.extend(block.successors())
+    before = len(cfg.blocks)
+    cfg.blocks = [block for block in cfg.blocks if block in reached]
+    return before - len(cfg.blocks)
+
+
+def merge_blocks(cfg):
+    """Fusionne un bloc avec son unique successeur quand il en est l'unique prédécesseur
+
+    Renvoie le nombre de blocs absorbés.
+    """
+    predecessors = cfg.predecessors()
+    roots = set(cfg.roots)
+    merged = set()
+    for block in cfg.blocks:
+        if block in merged:
+            continue
+        while block.exit in (None, OP_JUMP):
+            successor = block.target if block.exit == OP_JUMP else block.next
+            if (successor is None or successor is block or successor in roots
+                    or predecessors.get(successor) != 1):
+                break
+            block.code.extend(successor.code)
+            block.exit = successor.exit
+            block.target = successor.target
+            block.next = successor.next
+            merged.add(successor)
+    cfg.blocks = [block for block in cfg.blocks if block not in merged]
+    return len(merged)
+
+
+def layout_blocks(cfg):
+    """Ordonne les blocs : chemins chauds en ligne droite, blocs froids à la fin
+
+    La fréquence d'un bloc est estimée par sa profondeur de boucle (une
+    boucle est l'étendue d'un arc vers l'arrière dans le code d'origine).
+    Les arcs sont parcourus du plus fréquent au moins fréquent et relient
+    des chaînes de blocs, la destination juste après la source : le saut
+    devient un passage au bloc suivant. Les arcs vers l'arrière ne sont pas
+    utilisés, les boucles restent testées en bas. Chaque fonction commence
+    par la chaîne de son point d'entrée, puis viennent ses autres chaînes de
+    la plus chaude à la plus froide. Renvoie le nombre de blocs qui ont
+    changé de voisin suivant.
+    """
+    frequency = _frequencies(cfg.blocks)
+    roots = set(cfg.roots)
+
+    edges = []
+    for block in cfg.blocks:
+        for rank, successor in enumerate((block.next, block.target)):
+            if successor is None or successor.index <= block.index or successor in roots:
+                continue
+            weight = min(frequency[block], frequency[successor])
+            edges.append((-weight, rank, block.index, block, successor))
+    edges.sort(key=lambda edge: edge[:3])
+
+    # Chaînes : liens suivant/précédent, et union-find vers la tête de chaîne
+    following = {}
+    preceding = {}
+    parent = {}
+    for _, _, _, source, destination in edges:
+        if source in following or destination in preceding:
+            continue
+        head = _find(parent, source)
+        if head is _find(parent, destination):   # boucle dans la chaîne
+            continue
+        following[source] = destination
+        preceding[destination] = source
+        parent[destination] = head
+
+    # Fonctions dans l'ordre du code, chacune avec les chaînes qu'elle atteint
+    order = []
+    placed = set()
+    for root in cfg.roots:
+        heads = []
+        stack = [root]
+        while stack:
+            head = _find(parent, stack.pop())
+            if head in placed:
+                continue
+            placed.add(head)
+            heads.append(head)
+            block = head
+            while block is not None:
+                stack.extend(block.successors())
+                block = following.get(block)
+        heads[1:] = sorted(heads[1:], key=lambda head: (-frequency[head], head.index))
+        for block in heads:
+            while block is not None:
+                order.append(block)
+                block = following.get(block)
+
+    before = dict(zip(cfg.blocks, cfg.blocks[1:]))
+    moved = sum(1 for a, b in zip(order, order[1:]) if before.get(a) is not b)
+    cfg.blocks = order
+    return moved
+
+
+def _find(parent, block):
+    """Tête de la chaîne de block (union-find avec compression des chemins)"""
+    root = block
+    while root in parent:
+        root = parent[root]
+    while block is not root:
+        parent[block], block = root, parent[block]
+    return root
+
+
+def _frequencies(blocks):
+    """{bloc: fréquence estimée} d'après la profondeur de boucle"""
+    size = max((block.index for block in blocks), default=0) + 2
+    delta = [0] * size
+    for block in blocks:
+        for successor in (block.target, block.next):
+            if successor is not None and successor.index <= block.index:
+                # arc arrière : boucle de successor à block
+                delta[successor.index] += 1
+                delta[block.index + 1] -= 1
+    depth = []
+    current = 0
+    for change in delta:
+        current += change
+        depth.append(current)
+    return {block: LOOP_WEIGHT ** min(depth[block.index], 6) for block in blocks}
+
+
+# Passes, dans l'ordre où elles sont appliquées
+CFG_PASSES = [
+    ("empty_blocks", remove_empty_blocks),
+    ("jump_threading", thread_jumps),
+    ("unreachable", remove_unreachable),
+    ("merge_blocks", merge_blocks),
+    ("layout", layout_blocks),
+]
+
+
+def run_passes(cfg, passes=None):
+    """Applique les passes nommées (toutes par défaut), renvoie {passe: changements}"""
+    if passes is None:
+        table = CFG_PASSES
+    else:
+        known = dict(CFG_PASSES)
+        unknown = [name for name in passes if name not in known]
+        if unknown:
+            raise ValueError(f"Unknown CFG pass(es): {', '.join(unknown)}")
+        table = [(name, run) for name, run in CFG_PASSES if name in passes]
+    return {name: run(cfg) for name, run in table}
+
+
+# --- Mise à plat ---
+
+def linearize(cfg):
+    """Liste d'instructions MSM des blocs, dans l'ordre de cfg.blocks
+
+    Le passage au bloc suivant ne coûte rien ; sinon un jump est ajouté, et
+    un jumpt/jumpf dont la cible est le bloc suivant est inversé.
+    """
+    exits = []   # [(instructions de sortie, avec des blocs comme cibles)]
+    referenced = set()
+    blocks = cfg.blocks
+    for i, block in enumerate(blocks):
+        following = blocks[i + 1] if i + 1 < len(blocks) else None
+        jumps = []
+        if block.exit in (OP_RET, OP_HALT):
+            jumps.append((block.exit, None))
+        elif block.exit == OP_JUMP:
+            if block.target is not following:
+                jumps.append((OP_JUMP, block.target))
+        elif block.exit in BRANCHES:
+            if block.target is following:
+                jumps.append((FLIPPED[block.exit], block.next))
+            else:
+                jumps.append((block.exit, block.target))
+                if block.next is not following:
+                    jumps.append((OP_JUMP, block.next))
+        elif block.next is not None and block.next is not following:
+            jumps.append((OP_JUMP, block.next))
+        for _, target in jumps:
+            if target is not None:
+                referenced.add(target)
+        exits.append(jumps)
+
+    code = []
+    for block, jumps in zip(blocks, exits):
+        label = _label(block) if block in referenced else None
+        for name in block.names:
+            if name in cfg.entries or name == label:
+                code.append((OP_LABEL, name))
+        if label is not None and label not in block.names:
+            code.append((OP_LABEL, label))
+        code.extend(block.code)
+        for op, target in jumps:
+            code.append((op, None if target is None else _label(target)))
+    return code
+
+
+def _label(block):
+    """Étiquette qui nomme block dans les sauts (b.N s'il n'en a pas : le
+    point la distingue des noms de fonction)"""
+    return block.names[0] if block.names else f"b.{block.index}"
+
+
+if __name__ == "__main__":
+    from analyse_semantique import compile_code
+    from emetteur import format_instructions
+
+    source = """
+    int unused(int x) { return x; }
+    int f(int n) {
+        int s;
+        s = 0;
+        while (n > 0) {
+            if (n > 10) { s = s + 2; } else { s = s + 1; }
+            n = n - 1;
+        }
+        return s;
+    }
+    int main() { debug f(20) + 40; return 0; }
+    """
+    code = compile_code(source, verbose=False, opt_level=0).instructions
+    graph = build_cfg(code)
+    for block in graph.blocks:
+        print(block, "->", block.successors())
+    print(run_passes(graph))
+    print(format_instructions(linearize(graph)), end="")
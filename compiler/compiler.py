@@ -1,15 +1,57 @@
+import os
 import sys
 import argparse
 from analyse_semantique import compile_code
+from batch import compile_batch, read_manifest, default_output, format_report
+from cache import CompilationCache, DEFAULT_CACHE_SIZE
+from instrumentation import format_events
+from optimisation import format_inlining, INLINE_BUDGET
+from analyse_pile import analyze_stack, format_stack
+from image import write_image
+from machine import run_program, memory_for, MSMError, DEFAULT_MEMORY, BIG_MEMORY
 
 def main():
     parser=argparse.ArgumentParser(description='Compiler for subset of C')
-    parser.add_argument('input',help='Input source file')
-    parser.add_argument('-o','--output',help='Output assembly file', default='output.s')
+    parser.add_argument('inputs', nargs='*', metavar='input', help='Input source file(s)')
+    parser.add_argument('--manifest', help='File listing the sources to compile, one "source [output]" per line')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(), help='Worker processes in batch mode (default: %(default)s)')
+    parser.add_argument('--out-dir', help='Directory for the .s or .o files in batch mode (default: next to each source)')
+    parser.add_argument('-o','--output',help='Output assembly file (default: output.s, none with --run or --image)')
+    parser.add_argument('--image', help='Write a binary MSM image (run it with python image.py)')
+    parser.add_argument('-c', dest='object_code', action='store_true', help='Write relocatable objects (foo.c -> foo.o) for linker.py')
     parser.add_argument('--ast', action='store_true', help='Show AST')
     parser.add_argument('--run', action='store_true', help='Run with MSM after compilation')
+    parser.add_argument('-O', dest='opt_level', type=int, default=1, help='Optimization level (0: none, 1: constant folding, dead code elimination, inlining, loop-invariant code motion, loop rotation, tail calls, stack slot reuse, basic-block passes and peephole)')
+    parser.add_argument('--inline-budget', type=int, default=INLINE_BUDGET, help='Largest function body (AST nodes) inlined at its calls, 0 to disable (default: %(default)s)')
+    parser.add_argument('--opt-report', action='store_true', help='Show instructions removed by each peephole rule')
+    parser.add_argument('--cache-dir', help='Reuse compilations from this cache directory')
+    parser.add_argument('--cache-size', type=int, default=DEFAULT_CACHE_SIZE // (1024 * 1024), help='Cache size limit in MB (default: %(default)s)')
+    parser.add_argument('--cache-stats', action='store_true', help='Show cache hit/miss statistics')
+    parser.add_argument('-m', dest='big_memory', action='store_true', help='Run with 1<<24 memory cells (like msm -m) when the stack bound is unknown (recursion)')
+    parser.add_argument('--stack-report', action='store_true', help='Show the frame size and maximum stack depth of each function')
+    parser.add_argument('--time-passes', action='store_true', help='Report the time of each compiler phase, token/node counts and instructions per function')
+    parser.add_argument('--mem-report', action='store_true', help='Report the peak traced memory of each phase (slower)')
+    parser.add_argument('--report-format', choices=['text', 'json'], default='text', help='Format of the phase report: table or JSON lines (default: %(default)s)')
 
     args=parser.parse_args()
+    if args.object_code and (args.run or args.image):
+        parser.error("-c cannot be used with --run or --image")
+    if args.manifest or len(args.inputs) > 1:
+        if args.output or args.image or args.run or args.ast:
+            parser.error("-o, --image, --run and --ast take a single input")
+        if (args.time_passes or args.mem_report or args.report_format != 'text' or args.stack_report
+                or args.opt_report or args.cache_stats):
+            parser.error("--time-passes, --mem-report, --report-format, --stack-report, --opt-report "
+                         "and --cache-stats take a single input")
+        sys.exit(batch(args))
+    if len(args.inputs) != 1:
+        parser.error("an input file is required")
+    args.input = args.inputs[0]
+    output_file = args.output
+    if output_file is None and args.object_code:
+        output_file = default_output(args.input, suffix=".o")
+    elif output_file is None and not (args.run or args.image):
+        output_file = 'output.s'
 
     #Read input file
     try:
@@ -18,14 +60,86 @@ def main():
     except FileNotFoundError:
         print(f"Error: File '{args.input} not found")
         sys.exit(1)
-    
+
+    cache = None
+    if args.cache_dir:
+        cache = CompilationCache(args.cache_dir, max_bytes=args.cache_size * 1024 * 1024)
+
+    events = []
+    hooks = [events.append] if args.time_passes or args.mem_report else None
+
     #Compile
     try:
-        compile_code(source_code, output_file=args.output, show_ast=args.ast)
-        print(f"Compilation succesful: {args.output}")
+        result = compile_code(source_code, output_file=output_file, show_ast=args.ast, verbose=False,
+                              opt_level=args.opt_level, cache=cache,
+                              hooks=hooks, trace_memory=args.mem_report,
+                              inline_budget=args.inline_budget, object_code=args.object_code)
+        if output_file:
+            print(f"Compilation succesful: {output_file}")
+        if args.image:
+            write_image(args.image, result.instructions, result.header)
+            print(f"Image written: {args.image}")
+        if args.opt_report and "peephole" in result.stats:
+            print(f"AST nodes folded: {result.stats['folded']}, eliminated: {result.stats['eliminated']}", file=sys.stderr)
+            inlining = result.stats["inlining"]
+            print(f"Calls inlined: {sum(1 for entry in inlining if entry['inlined'])} of {len(inlining)}", file=sys.stderr)
+            for line in format_inlining(inlining).splitlines():
+                print(f"  {line}", file=sys.stderr)
+            print(f"Loop-invariant expressions hoisted: {result.stats['hoisted']}", file=sys.stderr)
+            built, kept = result.stats["blocks"]
+            print(f"Basic blocks: {built} built, {kept} after CFG passes", file=sys.stderr)
+            for name, changes in result.stats["cfg"].items():
+                print(f"  {name:<14} {changes:>6}", file=sys.stderr)
+            print(f"Instructions: {result.stats['generated']} generated, {result.stats['instructions']} after peephole", file=sys.stderr)
+            for rule, removed in result.stats["peephole"].items():
+                print(f"  {rule:<14} {removed:>6}", file=sys.stderr)
+            frames = result.stats["frames"]
+            print(f"Frame slots: {sum(b for b, _ in frames.values())} declared, "
+                  f"{sum(a for _, a in frames.values())} after slot reuse", file=sys.stderr)
+            for name, (before, after) in frames.items():
+                if after < before:
+                    print(f"  {name:<14} {before:>6} -> {after}", file=sys.stderr)
+        if args.stack_report and not args.object_code:
+            report = result.stats.get("stack") or analyze_stack(result.instructions)
+            print(format_stack(report), file=sys.stderr)
     except Exception as e:
         print(f"Compilation error: {e}")
         sys.exit(1)
-    
+    if events:
+        print(format_events(events, args.report_format), file=sys.stderr)
+    if cache is not None and args.cache_stats:
+        print("Cache: " + ", ".join(f"{k}={v}" for k, v in cache.stats().items()), file=sys.stderr)
+
+    #Run in-process on the Python MSM
+    if args.run:
+        try:
+            memory_size = memory_for(result.header, BIG_MEMORY if args.big_memory else DEFAULT_MEMORY)
+            vm = run_program(result.instructions, memory_size=memory_size)
+            if args.opt_report:
+                print(f"Executed instructions: {vm.steps}", file=sys.stderr)
+        except MSMError as e:
+            print(f"Runtime error: {e}")
+            sys.exit(1)
+
+def batch(args):
+    """Compile many files across a process pool, return the exit status"""
+    jobs = [(source, None) for source in args.inputs]
+    if args.manifest:
+        try:
+            jobs += read_manifest(args.manifest)
+        except (OSError, ValueError) as e:
+            print(f"Error: {e}")
+            return 1
+    suffix = ".o" if args.object_code else ".s"
+    jobs = [(source, output or default_output(source, args.out_dir, suffix)) for source, output in jobs]
+    if args.out_dir:
+        os.makedirs(args.out_dir, exist_ok=True)
+
+    results = compile_batch(jobs, workers=args.jobs, opt_level=args.opt_level,
+                            cache_dir=args.cache_dir, cache_size=args.cache_size * 1024 * 1024,
+                            object_code=args.object_code, inline_budget=args.inline_budget)
+    print(format_report(results))
+    return 1 if any(error is not None for _, _, error, _ in results) else 0
+
 if __name__=="__main__":
-    main()
\ No newline at end of file
+    main()
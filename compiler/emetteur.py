@@ -0,0 +1,175 @@
+"""
+Émetteur d'instructions MSM.
+
+Le générateur de code n'écrit plus directement sur la sortie standard : il
+remplit une liste compacte de paires (opcode, opérande) qui est ensuite écrite
+en une seule passe bufferisée, ou consommée directement (machine virtuelle,
+optimiseurs...).
+"""
+
+# Opcodes, dans le même ordre que l'enum de msm/msm.c
+(
+    OP_DROP, OP_DUP, OP_SWAP, OP_PUSH, OP_GET,
+    OP_SET, OP_READ, OP_WRITE, OP_ADD, OP_SUB,
+    OP_MUL, OP_DIV, OP_MOD, OP_NOT, OP_AND,
+    OP_OR, OP_CMPEQ, OP_CMPNE, OP_CMPLT, OP_CMPLE,
+    OP_CMPGT, OP_CMPGE, OP_JUMP, OP_JUMPT, OP_JUMPF,
+    OP_PREP, OP_CALL, OP_RET, OP_RESN, OP_SEND,
+    OP_RECV, OP_DBG, OP_HALT,
+) = range(33)
+
+# Pseudo-instruction : définition d'une étiquette (".L0")
+OP_LABEL = -1
+
+# Types d'opérande (comme opd[] dans msm.c)
+ARG_NONE = 0
+ARG_INT = 1
+ARG_LABEL = 2
+
+# (nom, type d'opérande) indexé par opcode
+OPCODES = [
+    ("drop", ARG_INT), ("dup", ARG_NONE), ("swap", ARG_NONE), ("push", ARG_INT), ("get", ARG_INT),
+    ("set", ARG_INT), ("read", ARG_NONE), ("write", ARG_NONE), ("add", ARG_NONE), ("sub", ARG_NONE),
+    ("mul", ARG_NONE), ("div", ARG_NONE), ("mod", ARG_NONE), ("not", ARG_NONE), ("and", ARG_NONE),
+    ("or", ARG_NONE), ("cmpeq", ARG_NONE), ("cmpne", ARG_NONE), ("cmplt", ARG_NONE), ("cmple", ARG_NONE),
+    ("cmpgt", ARG_NONE), ("cmpge", ARG_NONE), ("jump", ARG_LABEL), ("jumpt", ARG_LABEL), ("jumpf", ARG_LABEL),
+    ("prep", ARG_LABEL), ("call", ARG_INT), ("ret", ARG_NONE), ("resn", ARG_INT), ("send", ARG_NONE),
+    ("recv", ARG_NONE), ("dbg", ARG_NONE), ("halt", ARG_NONE),
+]
+
+OPCODE_BY_NAME = {name: op for op, (name, _) in enumerate(OPCODES)}
+
+
+class Emitter:
+    """
+    Tampon d'instructions :
+      - emit(op, arg)  : ajoute une instruction
+      - label(name)    : définit une étiquette à la position courante
+      - to_text()      : rend le programme au format texte de MSM
+      - write(f)       : écrit le programme dans un fichier en une passe
+    """
+    def __init__(self):
+        self.code = []     # [(opcode, opérande)]
+        self.labels = {}   # {nom: index dans code}
+
+    def emit(self, op, arg=None):
+        """Ajoute une instruction"""
+        self.code.append((op, arg))
+
+    def label(self, name):
+        """Définit une étiquette à la position courante"""
+        if name in self.labels:
+            raise ValueError(f"Label '{name}' already defined")
+        self.labels[name] = len(self.code)
+        self.code.append((OP_LABEL, name))
+
+    def instruction_count(self):
+        """Nombre d'instructions réelles (sans les étiquettes)"""
+        return sum(1 for op, _ in self.code if op != OP_LABEL)
+
+    def to_text(self):
+        return format_instructions(self.code)
+
+    def write(self, f):
+        f.write(self.to_text())
+
+
+def format_instruction(op, arg):
+    """Rend une instruction au format texte de MSM"""
+    if op == OP_LABEL:
+        return f".{arg}"
+    name = OPCODES[op][0]
+    if arg is None:
+        return name
+    return f"{name} {arg}"
+
+
+def format_instructions(code):
+    """Rend une liste d'instructions au format texte (une par ligne)"""
+    return "".join(format_instruction(op, arg) + "\n" for op, arg in code)
+
+
+def format_header(metadata):
+    """Rend des métadonnées {clé: valeur} en commentaires de tête "; clé: valeur"
+
+    msm.c et parse_instructions ignorent les commentaires : l'en-tête ne
+    change pas le programme.
+    """
+    return "".join(f"; {key}: {value}\n" for key, value in metadata.items())
+
+
+def parse_header(text):
+    """Relit les commentaires "; clé: valeur" en tête d'un programme texte MSM
+
+    Les valeurs entières sont converties, les autres restent des chaînes.
+    """
+    metadata = {}
+    for line in text.splitlines():
+        if not line.startswith(";"):
+            break
+        key, sep, value = line[1:].partition(":")
+        if sep:
+            value = value.strip()
+            metadata[key.strip()] = int(value) if value.lstrip("-").isdigit() else value
+    return metadata
+
+
+# Version du format des objets relogeables (compiler.py -c, linker.py)
+OBJECT_VERSION = 1
+
+
+def object_header(code, defines):
+    """En-tête d'un objet : fonctions définies et fonctions appelées ailleurs"""
+    requires = sorted({arg for op, arg in code if op == OP_PREP} - set(defines))
+    return {"object": OBJECT_VERSION, "defines": " ".join(defines), "requires": " ".join(requires)}
+
+
+def parse_object_header(text):
+    """Relit l'en-tête d'un objet : (fonctions définies, requises), None si ce n'en est pas un"""
+    header = parse_header(text)
+    if header.get("object") != OBJECT_VERSION:
+        return None
+    return str(header.get("defines", "")).split(), str(header.get("requires", "")).split()
+
+
+def label_table(code):
+    """{étiquette: indice} pour une liste d'instructions"""
+    return {arg: i for i, (op, arg) in enumerate(code) if op == OP_LABEL}
+
+
+def parse_instructions(text):
+    """Relit un programme texte MSM en liste d'instructions"""
+    code = []
+    for lno, line in enumerate(text.splitlines(), 1):
+        line = line.split(";", 1)[0]
+        tokens = line.split()
+        if tokens and tokens[0].startswith("."):
+            code.append((OP_LABEL, tokens[0][1:]))
+            tokens = tokens[1:]
+        if not tokens:
+            continue
+        op = OPCODE_BY_NAME.get(tokens[0])
+        if op is None:
+            raise SyntaxError(f"Unknown opcode <{tokens[0]}> at line {lno}")
+        kind = OPCODES[op][1]
+        if kind == ARG_NONE:
+            if len(tokens) != 1:
+                raise SyntaxError(f"Too many arguments at line {lno}")
+            code.append((op, None))
+        else:
+            if len(tokens) != 2:
+                raise SyntaxError(f"Invalid argument count at line {lno}")
+            code.append((op, int(tokens[1]) if kind == ARG_INT else tokens[1]))
+    return code
+
+
+if __name__ == "__main__":
+    em = Emitter()
+    em.label("start")
+    em.emit(OP_PUSH, 72)
+    em.emit(OP_SEND)
+    em.emit(OP_HALT)
+    print(em.to_text(), end="")
+    print(parse_instructions(em.to_text()) == em.code)
+    text = format_header({"stack": 1, "memory": 6}) + em.to_text()
+    print(parse_header(text), parse_instructions(text) == em.code)
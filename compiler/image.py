@@ -0,0 +1,105 @@
+"""
+Image binaire d'un programme MSM, chargée par mmap.
+
+Le format texte oblige msm.c à découper chaque ligne et à chercher chaque
+étiquette dans une liste chaînée. L'image contient le programme déjà
+assemblé (machine.assemble), avec des instructions de largeur fixe :
+
+    en-tête     magic "MSMB", version, nombre d'instructions n, indice de
+                .start, pile et mémoire de l'en-tête texte (analyse_pile.py,
+                UNBOUNDED si pas de borne)
+    opcodes     n octets (numérotation de msm.c), complétés à un multiple de 4
+    opérandes   n entiers 32 bits, étiquettes résolues en indices d'instruction
+
+Tout est en petit-boutiste. load_image projette le fichier en mémoire et
+donne à la machine virtuelle des memoryview sur les deux tableaux : rien
+n'est relu ni converti avant la première instruction.
+"""
+import mmap
+import struct
+import sys
+
+from machine import Program, MSMError, assemble
+
+IMAGE_MAGIC = b"MSMB"
+IMAGE_VERSION = 1
+UNBOUNDED = 0xFFFFFFFF
+
+# magic, version, réservé, instructions, start, pile, mémoire
+_HEADER = struct.Struct("<4sHHIIII")
+
+
+def write_image(path, instructions, header=None):
+    """Écrit une image binaire de instructions ([(opcode, opérande)])
+
+    header est l'en-tête du programme (CompilationResult.header).
+    """
+    program = assemble(instructions)
+    count = len(program)
+    header = header or {}
+    stack = header.get("stack")
+    memory = header.get("memory")
+    args = [0 if arg is None else arg for arg in program.args]
+    try:
+        operands = struct.pack(f"<{count}i", *args)
+    except struct.error:
+        raise ValueError("operand out of the 32-bit range") from None
+    with open(path, "wb") as f:
+        f.write(_HEADER.pack(IMAGE_MAGIC, IMAGE_VERSION, 0, count, program.labels["start"],
+                             stack if isinstance(stack, int) else UNBOUNDED,
+                             memory if isinstance(memory, int) else UNBOUNDED))
+        f.write(bytes(program.ops))
+        f.write(bytes(-count % 4))
+        f.write(operands)
+
+
+def load_image(path):
+    """Projette une image en mémoire, renvoie (Program, en-tête)
+
+    L'en-tête a la forme de CompilationResult.header ("unbounded" sans
+    borne), ce que machine.memory_for attend.
+    """
+    with open(path, "rb") as f:
+        try:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:   # fichier vide
+            raise MSMError(f"{path}: not an MSM image") from None
+    if len(data) < _HEADER.size:
+        raise MSMError(f"{path}: not an MSM image")
+    magic, version, _, count, start, stack, memory = _HEADER.unpack_from(data)
+    if magic != IMAGE_MAGIC:
+        raise MSMError(f"{path}: not an MSM image")
+    if version != IMAGE_VERSION:
+        raise MSMError(f"{path}: unsupported image version {version}")
+    operands = _HEADER.size + count + -count % 4
+    if len(data) != operands + 4 * count or start >= count:
+        raise MSMError(f"{path}: truncated image")
+
+    view = memoryview(data)
+    ops = view[_HEADER.size:_HEADER.size + count]
+    if sys.byteorder == "little":
+        args = view[operands:].cast("i")
+    else:
+        args = list(struct.unpack_from(f"<{count}i", data, operands))
+    header = {"stack": "unbounded" if stack == UNBOUNDED else stack,
+              "memory": "unbounded" if memory == UNBOUNDED else memory}
+    return Program(ops, args, {"start": start}), header
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from machine import VirtualMachine, memory_for, DEFAULT_MEMORY, BIG_MEMORY
+
+    parser = argparse.ArgumentParser(description="Run an MSM binary image")
+    parser.add_argument("image", help="Image written by compiler.py --image")
+    parser.add_argument("-m", dest="big_memory", action="store_true",
+                        help="Run with 1<<24 memory cells (like msm -m) when the stack bound is unknown")
+    args = parser.parse_args()
+    try:
+        program, header = load_image(args.image)
+        memory_size = memory_for(header, BIG_MEMORY if args.big_memory else DEFAULT_MEMORY)
+        VirtualMachine(program, memory_size).run()
+    except (OSError, MSMError) as e:
+        print(f"Runtime error: {e}")
+        sys.exit(1)
@@ -0,0 +1,106 @@
+"""
+Mesures d'une compilation : temps et mémoire par phase, compteurs.
+
+compile_code(..., hooks=[f]) appelle f(event) pour chaque événement, un
+dictionnaire sérialisable en JSON :
+
+    {"event": "phase", "phase": "lexer", "seconds": 0.012,
+     "peak_bytes": 183424, "retained_bytes": 90112, "tokens": 4282}
+    {"event": "summary", "seconds": 0.05, "tokens": 4282, "nodes": 2592,
+     "instructions": 2102, "functions": {"f0": 180, ...}, "peak_bytes": ...}
+
+Les champs *_bytes ne sont présents qu'avec trace_memory=True (tracemalloc,
+qui ralentit la compilation et mesure tout le processus : les valeurs n'ont
+de sens que pour une compilation à la fois). peak_bytes est le maximum de
+mémoire tracée pendant la phase, retained_bytes ce qu'elle a laissé alloué.
+"""
+import json
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+
+class Instrumentation:
+    """
+    Chronométrage des phases d'une compilation :
+      - phase(nom)  : contexte qui mesure la phase et émet son événement ;
+                      le dictionnaire produit peut recevoir des compteurs
+      - emit(event) : transmet un événement aux hooks
+      - events      : événements émis, dans l'ordre
+    """
+    def __init__(self, hooks=None, trace_memory=False):
+        self.hooks = list(hooks or [])
+        self.trace_memory = trace_memory
+        self.events = []
+        self._tracing = False   # tracemalloc démarré par nous
+
+    @property
+    def enabled(self):
+        """True si quelqu'un lit les mesures (les compteurs coûtent un parcours)"""
+        return bool(self.hooks) or self.trace_memory
+
+    def start(self):
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._tracing = True
+
+    def stop(self):
+        if self._tracing:
+            tracemalloc.stop()
+            self._tracing = False
+
+    @contextmanager
+    def phase(self, name):
+        record = {"event": "phase", "phase": name}
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        yield record
+        record["seconds"] = time.perf_counter() - start
+        if self.trace_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            record["peak_bytes"] = peak
+            record["retained_bytes"] = current - before
+        self.emit(record)
+
+    def emit(self, event):
+        self.events.append(event)
+        for hook in self.hooks:
+            hook(event)
+
+    def phases(self):
+        """[(phase, secondes)] des phases mesurées"""
+        return [(e["phase"], e["seconds"]) for e in self.events if e["event"] == "phase"]
+
+
+def format_events(events, fmt="text"):
+    """Rapport lisible ("text") ou une ligne JSON par événement ("json")"""
+    if fmt == "json":
+        return "\n".join(json.dumps(event, sort_keys=True) for event in events)
+
+    phases = [e for e in events if e["event"] == "phase"]
+    memory = any("peak_bytes" in e for e in phases)
+    width = max([10] + [len(e["phase"]) for e in phases])
+    header = f"{'phase':<{width}} {'time (s)':>9}"
+    if memory:
+        header += f" {'peak (KB)':>10} {'kept (KB)':>10}"
+    lines = [header]
+    for e in phases:
+        line = f"{e['phase']:<{width}} {e['seconds']:>9.4f}"
+        if memory:
+            line += f" {e['peak_bytes'] / 1024:>10.1f} {e['retained_bytes'] / 1024:>10.1f}"
+        lines.append(line)
+    lines.append(f"{'total':<{width}} {sum(e['seconds'] for e in phases):>9.4f}")
+
+    for summary in (e for e in events if e["event"] == "summary"):
+        counts = [f"{key}: {summary[key]}" for key in ("tokens", "nodes", "instructions") if key in summary]
+        if counts:
+            lines.append(", ".join(counts))
+        functions = summary.get("functions")
+        if functions:
+            lines.append("instructions per function:")
+            width = max(len(name) for name in functions)
+            for name, count in functions.items():
+                lines.append(f"  {name:<{width}} {count:>7}")
+    return "\n".join(lines)
@@ -0,0 +1,156 @@
+"""
+Édition de liens : objets relogeables (compiler.py -c) vers un programme MSM.
+
+Un objet est un programme texte MSM sans appel à main, précédé d'un en-tête
+(emetteur.object_header) :
+
+    ; object: 1
+    ; defines: f main     fonctions définies, chacune à partir de son étiquette
+    ; requires: g         cibles de prep définies dans un autre objet
+    .start                instructions de premier niveau, jusqu'à halt
+    ...
+    .f
+    ...
+
+Le lieur range les fonctions de tous les objets dans une table de hachage
+{nom: objet} (un nom défini deux fois est une erreur), part du code de
+premier niveau et de main pour ne garder que les fonctions atteintes par
+prep (une cible absente de la table est une erreur), et renomme les
+étiquettes locales de l'objet k en "o<k>.<étiquette>" : le point ne peut
+pas apparaître dans un nom de fonction. Le code de premier niveau des
+objets s'exécute dans l'ordre de la ligne de commande, puis main.
+"""
+from analyse_pile import analyze_stack
+from emetteur import (
+    OPCODES, ARG_LABEL, OP_LABEL, OP_PREP, OP_CALL, OP_DROP, OP_JUMP, OP_HALT,
+    format_header, format_instructions, parse_instructions, parse_object_header,
+)
+
+
+class LinkError(ValueError):
+    """Objet illisible, symbole défini deux fois ou jamais défini"""
+
+
+class ObjectFile:
+    """Objet relu : code de premier niveau et code de chaque fonction"""
+    def __init__(self, name, init, functions):
+        self.name = name             # pour les messages d'erreur
+        self.init = init             # [(opcode, opérande)], de .start à halt
+        self.functions = functions   # {nom: instructions, étiquette comprise}
+
+
+def parse_object(text, name="<object>"):
+    """Découpe le texte d'un objet en ObjectFile"""
+    header = parse_object_header(text)
+    if header is None:
+        raise LinkError(f"{name}: not an object file")
+    defines = set(header[0])
+    init = []
+    functions = {}
+    current = init
+    for op, arg in parse_instructions(text):
+        if op == OP_LABEL and arg in defines:
+            current = functions[arg] = []
+        elif op == OP_LABEL and arg == "end":
+            break
+        current.append((op, arg))
+    return ObjectFile(name, init, functions)
+
+
+def read_object(path):
+    """Lit un objet écrit par compiler.py -c"""
+    with open(path, 'r') as f:
+        return parse_object(f.read(), path)
+
+
+def link(objects):
+    """Programme complet à partir d'une liste d'ObjectFile
+
+    Renvoie (instructions, fonctions retirées car jamais appelées). Lève
+    LinkError pour un symbole défini deux fois ou appelé sans être défini.
+    """
+    symbols = {}   # {fonction: indice de l'objet qui la définit}
+    for k, obj in enumerate(objects):
+        for name in obj.functions:
+            if name in symbols:
+                raise LinkError(f"duplicate symbol '{name}' in {objects[symbols[name]].name} and {obj.name}")
+            symbols[name] = k
+
+    # Fonctions atteintes depuis le premier niveau et main
+    kept = set()
+    missing = {}   # {symbole: objet qui l'appelle}
+    pending = [(k, obj.init) for k, obj in enumerate(objects)]
+    if "main" in symbols:
+        pending.append((None, [(OP_PREP, "main")]))
+    while pending:
+        k, code = pending.pop()
+        for op, arg in code:
+            if op != OP_PREP or arg in kept:
+                continue
+            if arg not in symbols:
+                missing.setdefault(arg, objects[k].name)
+                continue
+            kept.add(arg)
+            owner = symbols[arg]
+            pending.append((owner, objects[owner].functions[arg]))
+    if missing:
+        raise LinkError(", ".join(f"undefined symbol '{name}' (called in {where})"
+                                  for name, where in sorted(missing.items())))
+
+    code = [(OP_LABEL, "start")]
+    for k, obj in enumerate(objects):
+        init = _relocate(obj.init, f"o{k}.", obj.functions)
+        # halt termine le premier niveau de l'objet : on passe au suivant
+        done = f"o{k}.end"
+        if init and init[-1][0] == OP_HALT:
+            init.pop()
+        if any(op == OP_HALT for op, _ in init):
+            init = [(OP_JUMP, done) if op == OP_HALT else (op, arg) for op, arg in init]
+            init.append((OP_LABEL, done))
+        code.extend(init)
+    if "main" in symbols:
+        code.extend([(OP_PREP, "main"), (OP_CALL, 0), (OP_DROP, 1)])
+    code.append((OP_HALT, None))
+    dropped = []
+    for k, obj in enumerate(objects):
+        for name, function in obj.functions.items():
+            if name in kept:
+                code.extend(_relocate(function, f"o{k}.", obj.functions))
+            else:
+                dropped.append(name)
+    code.append((OP_LABEL, "end"))
+    return code, dropped
+
+
+def _relocate(code, prefix, functions):
+    """Préfixe les étiquettes locales de code (tout sauf les fonctions de l'objet)"""
+    result = []
+    for op, arg in code:
+        if (op == OP_LABEL or (op != OP_PREP and OPCODES[op][1] == ARG_LABEL)) and arg not in functions:
+            arg = prefix + arg
+        result.append((op, arg))
+    return result
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    from image import write_image
+
+    parser = argparse.ArgumentParser(description="Link MSM object files (compiler.py -c) into a program")
+    parser.add_argument('objects', nargs='+', metavar='object', help='Object files, top-level code runs in this order')
+    parser.add_argument('-o', '--output', default='output.s', help='Output assembly file (default: %(default)s)')
+    parser.add_argument('--image', help='Also write a binary MSM image')
+    args = parser.parse_args()
+    try:
+        code, dropped = link([read_object(path) for path in args.objects])
+        header = analyze_stack(code).header()
+        with open(args.output, 'w') as f:
+            f.write(format_header(header) + format_instructions(code))
+        if args.image:
+            write_image(args.image, code, header)
+    except (OSError, LinkError) as e:
+        print(f"Link error: {e}")
+        sys.exit(1)
+    print(f"Link succesful: {args.output} ({len(dropped)} unreferenced function(s) dropped)")
@@ -0,0 +1,365 @@
+"""
+Machine virtuelle MSM en Python.
+
+Même sémantique que msm/msm.c (voir msm/msm.txt), mais :
+  - le programme est assemblé une seule fois en deux tableaux parallèles
+    (opcodes, opérandes) avec les étiquettes déjà résolues en indices ;
+  - la mémoire est un tableau alloué paresseusement au fur et à mesure que la
+    pile grandit, borné par memory_size (1 << 16 par défaut, comme msm) ;
+  - les sorties de send/dbg sont bufferisées.
+
+Comme dans msm.c, la pile part du haut de la mémoire et descend : l'adresse
+absolue A correspond à l'indice memory_size - 1 - A du tableau interne, si
+bien que les empilements se font par simple ajout en fin de tableau.
+"""
+import sys
+
+from emetteur import (
+    OPCODES, OP_LABEL, ARG_LABEL,
+    OP_DROP, OP_DUP, OP_SWAP, OP_PUSH, OP_GET, OP_SET, OP_READ, OP_WRITE,
+    OP_ADD, OP_SUB, OP_MUL, OP_DIV, OP_MOD, OP_NOT, OP_AND, OP_OR,
+    OP_CMPEQ, OP_CMPNE, OP_CMPLT, OP_CMPLE, OP_CMPGT, OP_CMPGE,
+    OP_JUMP, OP_JUMPT, OP_JUMPF, OP_PREP, OP_CALL, OP_RET, OP_RESN,
+    OP_SEND, OP_RECV, OP_DBG, OP_HALT,
+)
+
+DEFAULT_MEMORY = 1 << 16
+BIG_MEMORY = 1 << 24   # msm -m
+
+OUTPUT_BUFFER_SIZE = 1 << 13
+
+
+class MSMError(RuntimeError):
+    """Erreur d'assemblage ou d'exécution MSM"""
+
+
+# --- Arithmétique entière 32 bits façon C ---
+
+def wrap32(value):
+    """Ramène un entier Python sur un int C signé 32 bits"""
+    return ((value + 0x80000000) & 0xFFFFFFFF) - 0x80000000
+
+
+def c_div(a, b):
+    """Division entière C (troncature vers zéro)"""
+    if b == 0:
+        raise ZeroDivisionError("division by zero")
+    if a == -0x80000000 and b == -1:
+        raise OverflowError("integer overflow in division")
+    q = abs(a) // abs(b)
+    return wrap32(q if (a < 0) == (b < 0) else -q)
+
+
+def c_mod(a, b):
+    """Reste C : du signe du dividende"""
+    if b == 0:
+        raise ZeroDivisionError("division by zero")
+    return a - b * c_div(a, b)
+
+
+class Program:
+    """Programme assemblé : opcodes et opérandes dans deux tableaux parallèles"""
+    def __init__(self, ops, args, labels):
+        self.ops = ops          # [opcode]
+        self.args = args        # [opérande entière ou None], étiquettes résolues
+        self.labels = labels    # {nom: indice dans ops}
+
+    def __len__(self):
+        return len(self.ops)
+
+
+def assemble(instructions):
+    """Assemble une liste (opcode, opérande) en Program
+
+    Les étiquettes sont résolues une fois pour toutes en indices entiers.
+    """
+    labels = {}
+    pc = 0
+    for op, arg in instructions:
+        if op == OP_LABEL:
+            if arg in labels:
+                raise MSMError(f"invalid label <{arg}>")
+            labels[arg] = pc
+        else:
+            pc += 1
+
+    ops = []
+    args = []
+    for op, arg in instructions:
+        if op == OP_LABEL:
+            continue
+        if OPCODES[op][1] == ARG_LABEL:
+            if arg not in labels:
+                raise MSMError(f"undefined label <{arg}>")
+            arg = labels[arg]
+        ops.append(op)
+        args.append(arg)
+
+    if "start" not in labels:
+        raise MSMError("start not defined")
+    return Program(ops, args, labels)
+
+
+class VirtualMachine:
+    """
+    Interpréteur MSM :
+      - VirtualMachine(program) : prépare la machine pour un Program assemblé
+      - run()                   : exécute jusqu'à halt, renvoie le nombre
+                                  d'instructions exécutées
+    """
+    def __init__(self, program, memory_size=DEFAULT_MEMORY, stdout=None, stdin=None):
+        self.program = program
+        self.memory_size = memory_size
+        self.stdout = stdout if stdout is not None else sys.stdout.buffer
+        self.stdin = stdin if stdin is not None else sys.stdin.buffer
+        self.mem = []      # pile, indice 0 = adresse memory_size - 1
+        self.low = {}      # cases lues/écrites sous la pile, par indice interne
+        self.out = bytearray()
+        self.steps = 0
+
+    # --- Mémoire ---
+
+    def _grow(self, size):
+        """Étend le tableau mémoire pour contenir au moins size cases"""
+        if size > self.memory_size:
+            raise MSMError("stack overflow")
+        mem = self.mem
+        start = len(mem)
+        if size <= start:
+            return
+        new_size = min(max(size, 2 * start, 256), self.memory_size)
+        mem.extend([0] * (new_size - start))
+        for index in [i for i in self.low if i < new_size]:
+            mem[index] = self.low.pop(index)
+
+    def _index(self, address):
+        index = self.memory_size - 1 - address
+        if not 0 <= index < self.memory_size:
+            raise MSMError(f"invalid memory access at address {address}")
+        return index
+
+    def _read(self, address):
+        index = self._index(address)
+        if index < len(self.mem):
+            return self.mem[index]
+        return self.low.get(index, 0)
+
+    def _write(self, address, value):
+        index = self._index(address)
+        if index < len(self.mem):
+            self.mem[index] = value
+        else:
+            self.low[index] = value
+
+    # --- Entrées / sorties ---
+
+    def _send(self, data):
+        self.out += data
+        if len(self.out) >= OUTPUT_BUFFER_SIZE:
+            self.flush()
+
+    def flush(self):
+        if self.out:
+            self.stdout.write(bytes(self.out))
+            self.out.clear()
+        if hasattr(self.stdout, "flush"):
+            self.stdout.flush()
+
+    def _recv(self):
+        self.flush()
+        data = self.stdin.read(1)
+        return data[0] if data else -1
+
+    # --- Exécution ---
+
+    def run(self):
+        """Exécute le programme à partir de .start jusqu'à halt"""
+        ops = self.program.ops
+        args = self.program.args
+        n_ops = len(ops)
+        mem = self.mem
+        cap = len(mem)
+        pc = self.program.labels["start"]
+        sp = 0      # nombre de cases empilées
+        bp = 0
+        steps = 0
+        try:
+            while True:
+                if pc >= n_ops:
+                    raise MSMError(f"pc out of program ({pc})")
+                op = ops[pc]
+                arg = args[pc]
+                pc += 1
+                steps += 1
+                if sp + 2 > cap and op in _GROWING_OPS:
+                    self._grow(sp + 2)
+                    cap = len(mem)
+
+                if op == OP_PUSH:
+                    mem[sp] = arg
+                    sp += 1
+                elif op == OP_GET:
+                    i = bp + arg
+                    mem[sp] = mem[i] if i < cap else self.low.get(i, 0)
+                    sp += 1
+                elif op == OP_SET:
+                    sp -= 1
+                    i = bp + arg
+                    if i >= cap:
+                        self._grow(i + 1)
+                        cap = len(mem)
+                    mem[i] = mem[sp]
+                elif op == OP_DROP:
+                    sp -= arg
+                elif op == OP_DUP:
+                    mem[sp] = mem[sp - 1]
+                    sp += 1
+                elif op == OP_JUMPF:
+                    sp -= 1
+                    if not mem[sp]:
+                        pc = arg
+                elif op == OP_JUMPT:
+                    sp -= 1
+                    if mem[sp]:
+                        pc = arg
+                elif op == OP_JUMP:
+                    pc = arg
+                elif op == OP_ADD:
+                    sp -= 1
+                    mem[sp - 1] = wrap32(mem[sp - 1] + mem[sp])
+                elif op == OP_SUB:
+                    sp -= 1
+                    mem[sp - 1] = wrap32(mem[sp - 1] - mem[sp])
+                elif op == OP_MUL:
+                    sp -= 1
+                    mem[sp - 1] = wrap32(mem[sp - 1] * mem[sp])
+                elif op == OP_DIV:
+                    sp -= 1
+                    mem[sp - 1] = c_div(mem[sp - 1], mem[sp])
+                elif op == OP_MOD:
+                    sp -= 1
+                    mem[sp - 1] = c_mod(mem[sp - 1], mem[sp])
+                elif op == OP_CMPLT:
+                    sp -= 1
+                    mem[sp - 1] = int(mem[sp - 1] < mem[sp])
+                elif op == OP_CMPLE:
+                    sp -= 1
+                    mem[sp - 1] = int(mem[sp - 1] <= mem[sp])
+                elif op == OP_CMPGT:
+                    sp -= 1
+                    mem[sp - 1] = int(mem[sp - 1] > mem[sp])
+                elif op == OP_CMPGE:
+                    sp -= 1
+                    mem[sp - 1] = int(mem[sp - 1] >= mem[sp])
+                elif op == OP_CMPEQ:
+                    sp -= 1
+                    mem[sp - 1] = int(mem[sp - 1] == mem[sp])
+                elif op == OP_CMPNE:
+                    sp -= 1
+                    mem[sp - 1] = int(mem[sp - 1] != mem[sp])
+                elif op == OP_NOT:
+                    mem[sp - 1] = int(not mem[sp - 1])
+                elif op == OP_AND:
+                    sp -= 1
+                    mem[sp - 1] = int(bool(mem[sp - 1]) and bool(mem[sp]))
+                elif op == OP_OR:
+                    sp -= 1
+                    mem[sp - 1] = int(bool(mem[sp - 1]) or bool(mem[sp]))
+                elif op == OP_READ:
+                    mem[sp - 1] = self._read(mem[sp - 1])
+                elif op == OP_WRITE:
+                    self._write(mem[sp - 1], mem[sp - 2])
+                    sp -= 2
+                elif op == OP_SWAP:
+                    mem[sp - 1], mem[sp - 2] = mem[sp - 2], mem[sp - 1]
+                elif op == OP_PREP:
+                    mem[sp] = arg
+                    mem[sp + 1] = bp
+                    sp += 2
+                elif op == OP_CALL:
+                    bp = sp - arg
+                    mem[bp - 2], pc = pc, mem[bp - 2]
+                elif op == OP_RET:
+                    if bp < 2:
+                        raise MSMError("ret outside of a function")
+                    pc = mem[bp - 2]
+                    mem[bp - 2] = mem[sp - 1]
+                    sp = bp - 1
+                    bp = mem[bp - 1]
+                elif op == OP_RESN:
+                    sp += arg
+                    if sp > cap:
+                        self._grow(sp)
+                        cap = len(mem)
+                elif op == OP_SEND:
+                    sp -= 1
+                    self._send(bytes((mem[sp] & 0xFF,)))
+                elif op == OP_DBG:
+                    sp -= 1
+                    self._send(b"%d\n" % mem[sp])
+                elif op == OP_RECV:
+                    mem[sp] = self._recv()
+                    sp += 1
+                elif op == OP_HALT:
+                    break
+                else:
+                    raise MSMError(f"unknown opcode {op}")
+
+                if sp < 0:
+                    raise MSMError("stack underflow")
+        except ArithmeticError as e:
+            raise MSMError(f"{e} at pc {pc - 1}") from None
+        finally:
+            self.steps += steps
+            self.flush()
+        return steps
+
+
+# Instructions qui peuvent empiler jusqu'à deux cases
+_GROWING_OPS = frozenset((OP_PUSH, OP_GET, OP_DUP, OP_PREP, OP_RECV))
+
+
+def memory_for(header, memory_size=DEFAULT_MEMORY):
+    """Cases de mémoire à allouer d'après l'en-tête d'un programme
+
+    La mémoire calculée par le compilateur (analyse_pile.py) si l'en-tête en
+    donne une, sinon memory_size (programmes récursifs). Lève MSMError si
+    elle dépasse BIG_MEMORY : le programme déborderait même sous msm -m.
+    """
+    needed = header.get("memory")
+    if not isinstance(needed, int):
+        return memory_size
+    if needed > BIG_MEMORY:
+        raise MSMError(f"program needs {needed} memory cells, more than {BIG_MEMORY}")
+    return needed
+
+
+def run_program(instructions, memory_size=DEFAULT_MEMORY, stdout=None, stdin=None):
+    """Assemble et exécute une liste d'instructions, renvoie la machine"""
+    vm = VirtualMachine(assemble(instructions), memory_size, stdout, stdin)
+    vm.run()
+    return vm
+
+
+if __name__ == "__main__":
+    import io
+    from emetteur import parse_instructions
+
+    source = """
+.start
+    push 72
+    send
+    push 105
+    send
+    push 10
+    send
+    push 7
+    push 2
+    div
+    dbg
+    halt
+"""
+    out = io.BytesIO()
+    vm = run_program(parse_instructions(source), stdout=out)
+    print(out.getvalue().decode(), end="")
+    print("steps:", vm.steps)
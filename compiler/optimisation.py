@@ -0,0 +1,874 @@
+"""
+Optimisations sur l'arbre (Nd), entre SemanticAnalyzer et CodeGenerator.
+
+Les passes réécrivent l'arbre en place et renvoient le nœud (éventuellement
+remplacé). Elles conservent la sémantique entière de MSM : int C 32 bits,
+division tronquée vers zéro, comparaisons et opérateurs logiques à 0/1,
+&& et || évalués en court-circuit.
+"""
+from analyse_syntaxique import (
+    create_node,
+    ND_CONST, ND_NOT, ND_NEG, ND_ADD, ND_SUB, ND_MUL, ND_DIV,
+    ND_LT, ND_GT, ND_LE, ND_GE, ND_EQ, ND_NE, ND_AND, ND_OR,
+    ND_IF, ND_WHILE, ND_DOWHILE, ND_FOR, ND_BLOCK, ND_DROP, ND_RETURN,
+    ND_ASSIGN, ND_FUNC_CALL, ND_SWITCH, ND_CASE, ND_DEFAULT, ND_BREAK,
+    ND_IDENT, ND_DECL, ND_PTR_DECL, ND_ARRAY_DECL, ND_ARRAY_ACCESS, ND_ARRAY_ASSIGN,
+    ND_ADDRESS_OF, ND_DEREF, ND_DEREF_ASSIGN, ND_FUNC_DECL, ND_PROGRAM, ND_INLINE,
+)
+from allocation import frames, resize_frame
+from machine import wrap32, c_div
+from parcours import traverse, dispatch_table, uniform_table
+
+
+# Évaluation des opérateurs binaires sur des constantes
+CONST_EVAL = {
+    ND_ADD: lambda a, b: wrap32(a + b),
+    ND_SUB: lambda a, b: wrap32(a - b),
+    ND_MUL: lambda a, b: wrap32(a * b),
+    ND_DIV: c_div,
+    ND_LT:  lambda a, b: int(a < b),
+    ND_GT:  lambda a, b: int(a > b),
+    ND_LE:  lambda a, b: int(a <= b),
+    ND_GE:  lambda a, b: int(a >= b),
+    ND_EQ:  lambda a, b: int(a == b),
+    ND_NE:  lambda a, b: int(a != b),
+    ND_AND: lambda a, b: int(bool(a) and bool(b)),
+    ND_OR:  lambda a, b: int(bool(a) or bool(b)),
+}
+
+# Nœuds dont le résultat vaut toujours 0 ou 1
+BOOLEAN_NODES = (ND_NOT, ND_LT, ND_GT, ND_LE, ND_GE, ND_EQ, ND_NE, ND_AND, ND_OR)
+
+# Nœuds dont l'évaluation peut avoir un effet (écriture, appel, erreur)
+SIDE_EFFECT_NODES = (ND_ASSIGN, ND_FUNC_CALL, ND_DIV)
+
+
+def is_const(node, value=None):
+    """True si node est une constante (égale à value si précisée)"""
+    return node.type == ND_CONST and (value is None or node.valeur == value)
+
+
+def has_side_effects(node):
+    """True si l'évaluation de node peut avoir un effet observable"""
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if node.type in SIDE_EFFECT_NODES:
+            return True
+        stack.extend(node.enfant)
+    return False
+
+
+def constant_value(node):
+    """Value of an expression made only of constants, or None
+
+    Unlike fold_constants, the tree is left untouched.
+    """
+    values = {}
+    stack = [(node, False)]
+    while stack:
+        current, evaluated = stack.pop()
+        kind = current.type
+        if kind == ND_CONST:
+            values[id(current)] = current.valeur
+        elif not evaluated:
+            if kind not in CONST_EVAL and kind not in (ND_NEG, ND_NOT):
+                return None
+            stack.append((current, True))
+            stack.extend((child, False) for child in current.enfant)
+        else:
+            operands = [values[id(child)] for child in current.enfant]
+            if kind == ND_NEG:
+                values[id(current)] = wrap32(-operands[0])
+            elif kind == ND_NOT:
+                values[id(current)] = int(not operands[0])
+            else:
+                try:
+                    values[id(current)] = CONST_EVAL[kind](*operands)
+                except ArithmeticError:   # left for the program to fail at run time
+                    return None
+    return values[id(node)]
+
+
+def const_node(value):
+    return create_node(ND_CONST, valeur=value)
+
+
+class ConstantFolder:
+    """Constant folding and algebraic simplification on the AST"""
+    def __init__(self):
+        self.folded = 0   # number of nodes removed from the tree
+        self.rules = dispatch_table(self, "fold_")
+        self.table = uniform_table(self._fold_node)
+
+    def fold(self, node):
+        """Fold a subtree, return the node that replaces it"""
+        return traverse(self.table, node)
+
+    def _fold_node(self, node):
+        if node.enfant:
+            return self._fold_children(node)
+        method = self.rules[node.type]
+        return node if method is None else method(node)
+
+    def _fold_children(self, node):
+        # children first, then the rule of the node itself
+        for i, child in enumerate(node.enfant):
+            node.enfant[i] = yield child
+        method = self.rules[node.type]
+        return node if method is None else method(node)
+
+    def _replace(self, node, new_node):
+        self.folded += _size(node) - _size(new_node)
+        return new_node
+
+    def fold_binary(self, node):
+        left, right = node.enfant
+        if is_const(left) and is_const(right):
+            try:
+                value = CONST_EVAL[node.type](left.valeur, right.valeur)
+            except ArithmeticError:
+                return node   # the error has to happen at run time
+            return self._replace(node, const_node(value))
+        return node
+
+    def fold_nd_add(self, node):
+        left, right = node.enfant
+        if is_const(left, 0):
+            return self._replace(node, right)
+        if is_const(right, 0):
+            return self._replace(node, left)
+        if is_const(left) and not is_const(right):
+            # constants on the right, so that chains can be reassociated
+            node.enfant = [right, left]
+            left, right = right, left
+        if is_const(right) and left.type in (ND_ADD, ND_SUB) and is_const(left.enfant[1]):
+            # (x + c1) + c2 -> x + (c1 + c2),  (x - c1) + c2 -> x + (c2 - c1)
+            inner = left.enfant[1].valeur
+            value = wrap32(right.valeur + (inner if left.type == ND_ADD else -inner))
+            new_node = create_node(ND_ADD, children=[left.enfant[0], const_node(value)])
+            return self._replace(node, self.fold_nd_add(new_node))
+        return self.fold_binary(node)
+
+    def fold_nd_sub(self, node):
+        left, right = node.enfant
+        if is_const(right, 0):
+            return self._replace(node, left)
+        if is_const(right) and not is_const(left):
+            # x - c -> x + (-c), then handled like an addition
+            new_node = create_node(ND_ADD, children=[left, const_node(wrap32(-right.valeur))])
+            folded = self.fold_nd_add(new_node)
+            if folded is not new_node:
+                return folded   # new_node has the size of node, already counted
+        return self.fold_binary(node)
+
+    def fold_nd_mul(self, node):
+        left, right = node.enfant
+        for a, b in ((left, right), (right, left)):
+            if is_const(a, 1):
+                return self._replace(node, b)
+            if is_const(a, 0) and not has_side_effects(b):
+                return self._replace(node, const_node(0))
+        return self.fold_binary(node)
+
+    def fold_nd_div(self, node):
+        if is_const(node.enfant[1], 1):
+            return self._replace(node, node.enfant[0])
+        return self.fold_binary(node)
+
+    fold_nd_lt = fold_nd_gt = fold_nd_le = fold_nd_ge = fold_binary
+    fold_nd_eq = fold_nd_ne = fold_binary
+
+    def fold_nd_and(self, node):
+        left, right = node.enfant
+        # 0 && b never evaluates b; a && 0 still evaluates a
+        if is_const(left, 0) or (is_const(right, 0) and not has_side_effects(left)):
+            return self._replace(node, const_node(0))
+        if is_const(left) and right.type in BOOLEAN_NODES:   # 1 && b -> b
+            return self._replace(node, right)
+        return self.fold_binary(node)
+
+    def fold_nd_or(self, node):
+        left, right = node.enfant
+        # 1 || b never evaluates b; a || 1 still evaluates a
+        if is_const(left) and left.valeur != 0:
+            return self._replace(node, const_node(1))
+        if is_const(right) and right.valeur != 0 and not has_side_effects(left):
+            return self._replace(node, const_node(1))
+        if is_const(left, 0) and right.type in BOOLEAN_NODES:   # 0 || b -> b
+            return self._replace(node, right)
+        return self.fold_binary(node)
+
+    def fold_nd_not(self, node):
+        operand = node.enfant[0]
+        if is_const(operand):
+            return self._replace(node, const_node(int(not operand.valeur)))
+        # !!x is x when x is already 0/1 (so !!!x is !x)
+        if operand.type == ND_NOT and operand.enfant[0].type in BOOLEAN_NODES:
+            return self._replace(node, operand.enfant[0])
+        return node
+
+    def fold_nd_neg(self, node):
+        operand = node.enfant[0]
+        if is_const(operand):
+            return self._replace(node, const_node(wrap32(-operand.valeur)))
+        if operand.type == ND_NEG:
+            return self._replace(node, operand.enfant[0])
+        return node
+
+    # --- Conditions: only the truth value matters ---
+
+    def fold_condition(self, cond):
+        """Simplify an expression used only as a branch condition"""
+        while True:
+            if cond.type == ND_NOT and cond.enfant[0].type == ND_NOT:
+                new_cond = cond.enfant[0].enfant[0]        # !!x -> x
+            elif cond.type == ND_NE and is_const(cond.enfant[1], 0):
+                new_cond = cond.enfant[0]                   # x != 0 -> x
+            elif cond.type == ND_NE and is_const(cond.enfant[0], 0):
+                new_cond = cond.enfant[1]
+            else:
+                return cond
+            cond = self._replace(cond, new_cond)
+
+    def fold_nd_if(self, node):
+        node.enfant[0] = self.fold_condition(node.enfant[0])
+        return node
+
+    def fold_nd_while(self, node):
+        node.enfant[0] = self.fold_condition(node.enfant[0])
+        return node
+
+    def fold_nd_dowhile(self, node):
+        node.enfant[1] = self.fold_condition(node.enfant[1])
+        return node
+
+    def fold_nd_for(self, node):
+        node.enfant[1] = self.fold_condition(node.enfant[1])
+        return node
+
+
+def _size(node):
+    """Number of nodes in a subtree"""
+    size = 0
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        size += 1
+        stack.extend(node.enfant)
+    return size
+
+
+def fold_constants(ast):
+    """Run the constant folder on an analyzed AST, return (ast, nodes removed)"""
+    folder = ConstantFolder()
+    ast = folder.fold(ast)
+    return ast, folder.folded
+
+
+class DeadCodeEliminator:
+    """Remove constant-condition branches and unreachable statements"""
+    def __init__(self):
+        self.eliminated = 0   # number of nodes removed from the tree
+        self.table = dispatch_table(self, "dce_", self._eliminate_children)
+
+    def eliminate(self, node):
+        """Clean a subtree, return the node that replaces it"""
+        return traverse(self.table, node)
+
+    def _eliminate_children(self, node):
+        for i, child in enumerate(node.enfant):
+            node.enfant[i] = yield child
+        return node
+
+    def _replace(self, node, new_node):
+        self.eliminated += _size(node) - _size(new_node)
+        return new_node
+
+    def dce_nd_block(self, node):
+        children = []
+        reachable = True
+        for child in node.enfant:
+            if child.type in (ND_CASE, ND_DEFAULT):
+                # switch dispatch jumps here
+                reachable = True
+            elif not reachable:
+                # nothing after a return, a break or an endless loop
+                self.eliminated += _size(child)
+                continue
+            child = yield child
+            if is_empty(child):
+                self.eliminated += _size(child)
+                continue
+            children.append(child)
+            if terminates(child):
+                reachable = False
+        node.enfant = children
+        return node
+
+    def dce_nd_if(self, node):
+        cond = node.enfant[0]
+        if not is_const(cond):
+            for i in range(1, len(node.enfant)):
+                node.enfant[i] = yield node.enfant[i]
+            return node
+        if cond.valeur:
+            return (yield self._replace(node, node.enfant[1]))
+        if len(node.enfant) > 2:
+            return (yield self._replace(node, node.enfant[2]))
+        return self._replace(node, empty_node())
+
+    def dce_nd_while(self, node):
+        if is_const(node.enfant[0], 0):
+            return self._replace(node, empty_node())
+        node.enfant[1] = yield node.enfant[1]
+        return node
+
+    def dce_nd_for(self, node):
+        if is_const(node.enfant[1], 0):
+            # only the initialization is ever executed
+            return self._replace(node, node.enfant[0])
+        node.enfant[3] = yield node.enfant[3]
+        return node
+
+    def dce_nd_dowhile(self, node):
+        node.enfant[0] = yield node.enfant[0]
+        if has_break(node.enfant[0]):
+            return node   # the loop is the target of a break in its body
+        if is_const(node.enfant[1], 0) or terminates(node.enfant[0]):
+            # the body runs exactly once
+            return self._replace(node, node.enfant[0])
+        return node
+
+
+def empty_node():
+    """Statement that generates no code"""
+    return create_node(ND_BLOCK)
+
+
+def is_empty(node):
+    """True for statements without any effect"""
+    if node.type == ND_BLOCK:
+        return not node.enfant and not node.is_root
+    if node.type == ND_DROP:
+        return not has_side_effects(node.enfant[0])
+    return False
+
+
+def terminates(node):
+    """True if control never falls through to the next statement"""
+    return traverse(TERMINATES_TABLE, node)
+
+
+def _terminates(node):
+    if node.type in (ND_RETURN, ND_BREAK):
+        return True
+    if node.type == ND_BLOCK:
+        return _any_terminates(node.enfant)
+    if node.type == ND_IF:
+        return len(node.enfant) > 2 and _all_terminate(node.enfant[1:])
+    # a loop left by a break falls through
+    if node.type == ND_WHILE:
+        return is_const(node.enfant[0]) and node.enfant[0].valeur != 0 and not has_break(node.enfant[1])
+    if node.type == ND_FOR:
+        return is_const(node.enfant[1]) and node.enfant[1].valeur != 0 and not has_break(node.enfant[3])
+    if node.type == ND_DOWHILE:
+        if has_break(node.enfant[0]):
+            return False
+        if is_const(node.enfant[1]) and node.enfant[1].valeur != 0:
+            return True
+        return _any_terminates(node.enfant[:1])
+    return False
+
+
+def _any_terminates(nodes):
+    for child in nodes:
+        if (yield child):
+            return True
+    return False
+
+
+def _all_terminate(nodes):
+    for child in nodes:
+        if not (yield child):
+            return False
+    return True
+
+
+TERMINATES_TABLE = uniform_table(_terminates)
+
+# Statements that are the target of the breaks they contain
+BREAK_TARGETS = (ND_WHILE, ND_FOR, ND_DOWHILE, ND_SWITCH)
+
+
+def has_break(node):
+    """True if node contains a break that leaves node's enclosing statement"""
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if node.type == ND_BREAK:
+            return True
+        if node.type not in BREAK_TARGETS:
+            stack.extend(node.enfant)
+    return False
+
+
+def eliminate_dead_code(ast):
+    """Run dead code elimination on an analyzed AST, return (ast, nodes removed)"""
+    eliminator = DeadCodeEliminator()
+    ast = eliminator.eliminate(ast)
+    return ast, eliminator.eliminated
+
+
+# Opérateurs sans effet ni erreur possible, calculables avant la boucle
+PURE_OPERATORS = (ND_NOT, ND_NEG, ND_ADD, ND_SUB, ND_MUL,
+                  ND_LT, ND_GT, ND_LE, ND_GE, ND_EQ, ND_NE, ND_AND, ND_OR)
+
+# Écritures par adresse : un pointeur peut désigner n'importe quelle case
+# (une fonction appelée peut écrire par un pointeur reçu)
+MEMORY_WRITES = (ND_ARRAY_ASSIGN, ND_DEREF_ASSIGN, ND_FUNC_CALL)
+
+LOCAL_DECLARATIONS = (ND_DECL, ND_PTR_DECL, ND_ARRAY_DECL)
+
+# Lectures par adresse : l'adresse n'est valide que si le programme l'évalue
+MEMORY_READS = (ND_ARRAY_ACCESS, ND_DEREF)
+
+
+class LoopInvariantMotion:
+    """Compute loop-invariant expressions once, in temporaries before the loop
+
+    An expression is invariant when it has no effect and cannot fail, and
+    nothing it reads is written in the loop. A write through a pointer,
+    an array element or a call may reach any memory cell, so it makes
+    every array or pointer read variable, along with the variables whose
+    address is taken. Temporaries are new slots at the end of the
+    enclosing frame, packed afterwards by the frame layout.
+
+    An array or pointer read can fail on an address the program never
+    reads, so it is only hoisted when every iteration evaluates it, and
+    when the loop runs at least once: a while or for loop then becomes
+    "if (condition) do ... while (condition)", as loop rotation emits it.
+    """
+    def __init__(self):
+        self.hoisted = 0       # expressions replaced by a temporary
+        self.temporaries = 0   # names them
+        self.frames = []       # [slots, addresses taken with &] of the enclosing frames
+        # loops are only found in statements: expressions are left as they are
+        self.table = dispatch_table(self, "licm_", lambda node: node)
+
+    def hoist(self, node):
+        """Transform a subtree, return the node that replaces it"""
+        return traverse(self.table, node)
+
+    def _hoist_children(self, node):
+        for i, child in enumerate(node.enfant):
+            node.enfant[i] = yield child
+        return node
+
+    licm_nd_if = licm_nd_switch = _hoist_children
+
+    def _enter_frame(self, size, items):
+        frame = [size, _addresses_taken(items)]
+        self.frames.append(frame)
+        return frame
+
+    def licm_nd_program(self, node):
+        items = [child for child in node.enfant if child.type != ND_FUNC_DECL]
+        frame = self._enter_frame(node.total_declarations, items)
+        for i, child in enumerate(node.enfant):
+            if child.type != ND_FUNC_DECL:
+                node.enfant[i] = yield child
+        self.frames.pop()
+        node.total_declarations = frame[0]
+        for child in node.enfant:
+            if child.type == ND_FUNC_DECL:
+                yield child
+        return node
+
+    def licm_nd_func_decl(self, node):
+        if node.cached_code is not None:
+            return node
+        params = sum(1 for child in node.enfant if child.is_parameter)
+        frame = self._enter_frame(params + node.local_count, node.enfant[-1:])
+        node.enfant[-1] = yield node.enfant[-1]
+        self.frames.pop()
+        node.local_count = frame[0] - params
+        return node
+
+    def licm_nd_block(self, node):
+        if not node.is_root:
+            return (yield from self._hoist_children(node))
+        frame = self._enter_frame(node.total_declarations, [node])
+        yield from self._hoist_children(node)
+        self.frames.pop()
+        node.total_declarations = frame[0]
+        return node
+
+    def licm_nd_while(self, node):
+        # outer loop first: what it hoists leaves the inner loops too
+        replacement, loop = self._hoist_loop(node) if self.frames else (node, node)
+        yield from self._hoist_children(loop)
+        return replacement
+
+    licm_nd_for = licm_nd_dowhile = licm_nd_while
+
+    def _hoist_loop(self, loop):
+        """(replacement, loop whose children remain to visit)
+
+        The replacement is { temporaries; loop } if some expression of loop
+        is invariant, with the loop behind a guard if a memory read is.
+        """
+        taken = self.frames[-1][1]
+        written = set()
+        memory = False
+        stack = list(loop.enfant)
+        while stack:
+            node = stack.pop()
+            if node.type == ND_ASSIGN:
+                written.add(node.enfant[0].address)
+            elif node.type in LOCAL_DECLARATIONS:   # a new variable at each iteration
+                written.add(node.address)
+            elif node.type in MEMORY_WRITES:
+                memory = True
+            stack.extend(node.enfant)
+        if memory:
+            written |= taken
+
+        # Memory reads only run before the loop if it runs at least once:
+        # a do-while, an endless loop, or a loop behind a copy of its
+        # condition (not with declarations: an inlined call)
+        condition = loop.enfant[1] if loop.type == ND_FOR else loop.enfant[0]
+        guard = None
+        if loop.type != ND_DOWHILE and not (is_const(condition) and condition.valeur != 0):
+            if _declares(condition):
+                memory = True
+            else:
+                guard = _relocated_copy(condition, 0)
+
+        # Expressions in post-order, with their position and whether an
+        # iteration may skip them (a for loop's initialization runs only once)
+        first = 1 if loop.type == ND_FOR else 0
+        leaves = any(node.type == ND_RETURN for node in _walk(loop)) or any(
+            has_break(child) for child in loop.enfant)
+        nodes = []
+        stack = [(loop.enfant[i], loop, i, leaves) for i in range(first, len(loop.enfant))]
+        if loop.type != ND_DOWHILE:   # the first test runs in any case
+            stack[0] = (condition, loop, first, False)
+        skipped = set()   # id() of the nodes an iteration may skip
+        while stack:
+            node, parent, index, maybe = stack.pop()
+            nodes.append((node, parent, index))
+            if maybe:
+                skipped.add(id(node))
+            for i, child in enumerate(node.enfant):
+                stack.append((child, node, i, maybe or _skippable(node, i)))
+        keys = {}   # {id(node): structural key} of the invariant nodes
+        for node, _, _ in reversed(nodes):
+            key = _invariant_key(node, keys, written, memory or id(node) in skipped)
+            if key is not None:
+                keys[id(node)] = key
+
+        temporaries = {}   # {key: (address, name)}
+        hoisted = []
+        for node, parent, index in nodes:
+            key = keys.get(id(node))
+            if (key is None or node.type in (ND_CONST, ND_IDENT, ND_ADDRESS_OF)
+                    or id(parent) in keys or parent.type == ND_ADDRESS_OF):
+                continue
+            if key not in temporaries:
+                self.temporaries += 1
+                temporaries[key] = (self.frames[-1][0], f"licm.{self.temporaries}")
+                self.frames[-1][0] += 1
+                hoisted.append((node, *temporaries[key]))
+            address, name = temporaries[key]
+            parent.enfant[index] = _variable(ND_IDENT, name, address)
+            self.hoisted += 1
+        if not hoisted:
+            return loop, loop
+        declarations = [_variable(ND_DECL, name, address) for _, address, name in hoisted]
+        assignments = [create_node(ND_ASSIGN, children=[_variable(ND_IDENT, name, address), node])
+                       for node, address, name in hoisted]
+        if guard is None or not any(_reads_memory(key) for key in temporaries):
+            return create_node(ND_BLOCK, children=declarations + assignments + [loop]), loop
+
+        # init; if (condition) { temporaries; do { body; increment } while (condition) }
+        if loop.type == ND_FOR:
+            init, condition, increment, body = loop.enfant
+            declarations.append(init)
+            body = create_node(ND_BLOCK, children=[body, increment])
+        else:
+            condition, body = loop.enfant
+        rotated = create_node(ND_DOWHILE, children=[body, condition])
+        entry = create_node(ND_BLOCK, children=assignments + [rotated])
+        declarations.append(create_node(ND_IF, children=[guard, entry]))
+        return create_node(ND_BLOCK, children=declarations), rotated
+
+
+def _variable(node_type, name, address):
+    node = create_node(node_type, chaine=name)
+    node.address = address
+    return node
+
+
+def _walk(node):
+    """Nodes of a subtree"""
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        yield node
+        stack.extend(node.enfant)
+
+
+def _declares(node):
+    """True if a subtree declares a variable"""
+    return any(child.type in LOCAL_DECLARATIONS for child in _walk(node))
+
+
+def _skippable(node, index):
+    """True if evaluating node may skip its child at index"""
+    if node.type in (ND_IF, ND_SWITCH, ND_AND, ND_OR):
+        return index > 0
+    # an inner loop may run zero times
+    return node.type in (ND_WHILE, ND_FOR, ND_DOWHILE)
+
+
+def _reads_memory(key):
+    """True if the expression of an invariant key reads an array or a pointer"""
+    return key[0] in MEMORY_READS or any(isinstance(part, tuple) and _reads_memory(part)
+                                         for part in key[1:])
+
+
+def _addresses_taken(items):
+    """Addresses of the variables used with & in a frame"""
+    taken = set()
+    stack = list(items)
+    while stack:
+        node = stack.pop()
+        if node.type == ND_FUNC_DECL:
+            continue
+        if node.type == ND_ADDRESS_OF and node.enfant[0].type == ND_IDENT:
+            taken.add(node.enfant[0].address)
+        stack.extend(node.enfant)
+    return taken
+
+
+def _invariant_key(node, keys, written, memory):
+    """Structural key of node if its value is the same at every iteration, else None
+
+    The keys of its children are already in keys. memory is true when an
+    array or pointer read of node may not be hoisted.
+    """
+    kind = node.type
+    if kind == ND_CONST:
+        return (kind, node.valeur)
+    if kind == ND_IDENT:
+        return None if node.address in written else (kind, node.address)
+    if kind == ND_ADDRESS_OF:
+        operand = node.enfant[0]
+        if operand.type == ND_IDENT:
+            return (kind, operand.address)
+        index = keys.get(id(operand.enfant[1]))   # &t[i] reads nothing
+        return None if index is None else (kind, operand.enfant[0].address, index)
+    if kind in MEMORY_READS:
+        if memory:
+            return None
+    elif kind == ND_DIV:
+        if not is_const(node.enfant[1]) or node.enfant[1].valeur == 0:
+            return None
+    elif kind not in PURE_OPERATORS:
+        return None
+    children = tuple(keys.get(id(child)) for child in node.enfant)
+    if None in children:
+        return None
+    return (kind,) + children
+
+
+def hoist_invariants(ast):
+    """Run loop-invariant code motion on an analyzed AST, return (ast, expressions hoisted)"""
+    motion = LoopInvariantMotion()
+    ast = motion.hoist(ast)
+    return ast, motion.hoisted
+
+
+# Largest body (in AST nodes) of a function inlined at its call sites
+INLINE_BUDGET = 40
+
+# What keeps a function from being inlined: a call (only leaves are
+# inlined, so never a recursive function), or the address of a slot of its
+# frame (read/write use absolute addresses, which change with the frame)
+NOT_INLINABLE = {
+    ND_FUNC_CALL: "calls a function",
+    ND_ARRAY_DECL: "declares an array",
+    ND_ADDRESS_OF: "takes an address",
+}
+
+
+class Inliner:
+    """Replace calls to small leaf functions by a copy of their body
+
+    The copy is an ND_INLINE node: the parameters become new variables of
+    the caller's frame, assigned from the arguments in order, followed by
+    the body whose locals also move to new slots of the caller's frame
+    (the frame layout packs them afterwards). A return in the copy leaves
+    its value on the stack and jumps to the end of the ND_INLINE.
+    """
+    def __init__(self, functions, budget=INLINE_BUDGET):
+        self.functions = {function.chaine: function for function in functions}
+        self.budget = budget
+        self.reasons = {}   # {name: why it cannot be inlined, None if it can}
+        self.report = []    # one entry per call site
+
+    def reason(self, name, arity):
+        """Why a call to name cannot be inlined, None if it can"""
+        function = self.functions.get(name)
+        if function is None:
+            return "not defined in this file"
+        params = sum(1 for child in function.enfant if child.is_parameter)
+        if params != arity:
+            return f"takes {params} arguments, not {arity}"
+        if name not in self.reasons:
+            self.reasons[name] = self._function_reason(function)
+        return self.reasons[name]
+
+    def _function_reason(self, function):
+        body = function.enfant[-1]
+        size = _size(body)
+        if size > self.budget:
+            return f"too large ({size} nodes > {self.budget})"
+        stack = [body]
+        while stack:
+            node = stack.pop()
+            if node.type in NOT_INLINABLE:
+                return NOT_INLINABLE[node.type]
+            stack.extend(node.enfant)
+        if not terminates(body):
+            return "may end without return"
+        return None
+
+    def inline_frame(self, caller, items, size):
+        """Inline the calls in the statements of a frame, return its new size"""
+        sites = 0
+        stack = [(item, None, 0) for item in items]
+        while stack:
+            node, parent, index = stack.pop()
+            if node.type == ND_FUNC_CALL:
+                sites += 1
+                function = self.functions.get(node.chaine)
+                reason = self.reason(node.chaine, len(node.enfant))
+                entry = {"caller": caller, "callee": node.chaine, "site": sites,
+                         "inlined": reason is None}
+                self.report.append(entry)
+                if reason is not None:
+                    entry["reason"] = reason
+                else:
+                    entry["size"] = _size(function.enfant[-1])
+                    node = parent.enfant[index] = self._expand(node, function, size)
+                    size += sum(1 for child in function.enfant if child.is_parameter) + function.local_count
+            if node.type != ND_FUNC_DECL:
+                stack.extend((child, node, i) for i, child in reversed(list(enumerate(node.enfant))))
+        return size
+
+    def _expand(self, call, function, offset):
+        """ND_INLINE for call, the callee's slots starting at offset"""
+        params = [child.chaine for child in function.enfant if child.is_parameter]
+        declarations = [_variable(ND_DECL, name, offset + i) for i, name in enumerate(params)]
+        assignments = [create_node(ND_ASSIGN, children=[_variable(ND_IDENT, name, offset + i), argument])
+                       for i, (name, argument) in enumerate(zip(params, call.enfant))]
+        body = _relocated_copy(function.enfant[-1], offset)
+        return create_node(ND_INLINE, chaine=call.chaine, children=declarations + assignments + [body])
+
+
+def _relocated_copy(node, offset):
+    """Copy of a subtree with its slot addresses moved by offset"""
+    root = _copy_node(node, offset)
+    stack = [(node, root)]
+    while stack:
+        original, copy = stack.pop()
+        if original.enfant:
+            copy.enfant = [_copy_node(child, offset) for child in original.enfant]
+            stack.extend(zip(original.enfant, copy.enfant))
+    return root
+
+
+def _copy_node(node, offset):
+    copy = create_node(node.type, node.valeur, node.chaine)
+    if node.address is not None:
+        copy.address = node.address + offset
+    if node.annotations:
+        copy.annotations = dict(node.annotations)
+    return copy
+
+
+def inline_calls(ast, budget=INLINE_BUDGET, include=()):
+    """Inline small leaf functions in an analyzed program, return (ast, report)
+
+    Functions reused from the cache are only inlined into when their name
+    is in include. The report has one entry per call site: caller, callee,
+    site (number of the call in the caller), inlined, and size or reason.
+    """
+    if ast.type != ND_PROGRAM or budget <= 0:
+        return ast, []
+    inliner = Inliner([child for child in ast.enfant if child.type == ND_FUNC_DECL], budget)
+    for name, owner, items, base, size in frames(ast, include):
+        resize_frame(owner, base, inliner.inline_frame(name, items, size))
+    return ast, inliner.report
+
+
+def format_inlining(report):
+    """One line per call site"""
+    lines = []
+    for entry in report:
+        site = f"{entry['caller']} -> {entry['callee']} #{entry['site']}"
+        if entry["inlined"]:
+            lines.append(f"{site}: inlined ({entry['size']} nodes)")
+        else:
+            lines.append(f"{site}: not inlined, {entry['reason']}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    import io
+
+    from analyse_syntaxique import parse
+    from analyse_semantique import compile_code
+    from machine import run_program, memory_for
+
+    for source in ["debug 2 * 3 + 4;", "debug x * 1 + 0;", "debug (x + 1) + 2 - 5;",
+                   "debug !!(x < 3);", "debug -(-x);", "debug f(x) * 0;", "debug 7 / 0;",
+                   "if (!!x) debug 1;"]:
+        ast, removed = fold_constants(parse(source))
+        print(f"{source:<26} ", end="")
+        ast.afficher()
+        print(f"   [-{removed}]")
+
+    for source in ["{ if (1 < 2) debug 1; else debug 2; while (False) debug 3; }",
+                   "{ debug 1; return 2; debug 3; }",
+                   "{ while (True) { debug 1; } debug 2; }",
+                   "{ do { debug 1; } while (0); 3 + 4; }"]:
+        ast, _ = fold_constants(parse(source))
+        ast, removed = eliminate_dead_code(ast)
+        print(f"{source:<26} ", end="")
+        ast.afficher()
+        print(f"   [-{removed}]")
+
+    guarded = """
+    int f(int n, int k) {
+        int t[3]; int s; t[0] = 1; t[1] = 2; t[2] = 3; s = 0;
+        for (int i = 0; i < n; i = i + 1) { if (k < 3) { s = s + t[k]; } }
+        return s;
+    }
+    int main() { debug f(4, 100000) + 48; debug f(4, 2) + 48; return 0; }
+    """
+    zero_trip = """
+    int f(int n, int k) {
+        int t[3]; int s; int i; t[0] = 1; t[1] = 2; t[2] = 3; s = 0; i = 0;
+        while (i < n) { s = s + t[k]; i = i + 1; }
+        return s;
+    }
+    int main() { debug f(0, 100000) + 48; debug f(3, 2) + 48; return 0; }
+    """
+    for source in (guarded, zero_trip):
+        result = compile_code(source, verbose=False)
+        out = io.BytesIO()
+        run_program(result.instructions, memory_for(result.header), stdout=out)
+        print(f"hoisted: {result.stats['hoisted']}, output: {out.getvalue()}")
@@ -1,24 +1,23 @@
 .start
-resn 12
+prep main
+call 0
+drop 1
+halt
 .sumArray
-resn 2
+resn 12
 push 0
-dup
 set 11
-drop 1
 push 0
-dup
 set 12
-drop 1
-.L0
+.sumArray.L0
 get 12
 get 0
 cmplt
-jumpf L1
+jumpf sumArray.L1
+get 12
 push 1
 get 12
 add
-get 12
 write
 get 11
 push 1
@@ -26,20 +25,22 @@ get 12
 add
 read
 add
-dup
 set 11
-drop 1
 get 12
 push 1
 add
-dup
 set 12
-drop 1
-jump L0
-.L1
+jump sumArray.L0
+.sumArray.L1
 get 11
 ret
+.main
+prep sumArray
+push 5
+call 1
+push 48
+add
+send
+push 0
 ret
-drop 13
-halt
 .end
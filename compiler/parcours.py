@@ -0,0 +1,70 @@
+"""
+Parcours d'arbre sans récursion Python.
+
+Un visiteur associe à chaque type de nœud (ND_*) un gestionnaire, trouvé une
+fois pour toutes dans une table indexée par le type. Un gestionnaire qui n'a
+pas besoin de ses enfants renvoie directement son résultat ; sinon c'est un
+générateur qui fait `yield enfant` pour chaque enfant à visiter et reçoit en
+retour le résultat de cette visite :
+
+    def gen_nd_add(self, node):
+        yield node.enfant[0]
+        yield node.enfant[1]
+        self.emit(OP_ADD)
+
+Les générateurs en cours sont gardés sur une pile explicite : la profondeur
+de l'arbre n'est limitée que par la mémoire, et le coût reste linéaire.
+"""
+from types import GeneratorType
+
+from analyse_syntaxique import NODE_NAMES
+
+
+def traverse(table, node):
+    """Visite node avec table[type](node) -> résultat ou générateur"""
+    result = table[node.type](node)
+    if type(result) is not GeneratorType:
+        return result
+    stack = [result]
+    result = None
+    while stack:
+        try:
+            child = stack[-1].send(result)
+        except StopIteration as stop:
+            stack.pop()
+            result = stop.value
+            continue
+        result = table[child.type](child)
+        if type(result) is GeneratorType:
+            stack.append(result)
+            result = None
+    return result
+
+
+def dispatch_table(visitor, prefix, default=None):
+    """[gestionnaire par type de nœud] : méthodes prefix + nom du type"""
+    return [getattr(visitor, prefix + name, default) for name in NODE_NAMES]
+
+
+def uniform_table(handler):
+    """Table qui envoie tous les types de nœud au même gestionnaire"""
+    return [handler] * len(NODE_NAMES)
+
+
+class Visitor:
+    """
+    Base des visiteurs : les sous-classes définissent PREFIX et des méthodes
+    PREFIX + nom de type (gen_nd_add, ...). Les types sans méthode vont à
+    default(node).
+    """
+    PREFIX = None
+
+    def __init__(self):
+        self.table = dispatch_table(self, self.PREFIX, self.default)
+
+    def default(self, node):
+        raise ValueError(f"Unknown node type: {NODE_NAMES[node.type]}")
+
+    def visit(self, node):
+        """Visite un sous-arbre, renvoie le résultat de son gestionnaire"""
+        return traverse(self.table, node)
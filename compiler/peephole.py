@@ -0,0 +1,218 @@
+"""
+Optimiseur à lucarne (peephole) sur le flux d'instructions MSM.
+
+Chaque règle de PEEPHOLE_RULES regarde la fin du flux déjà produit et, si elle
+reconnaît un motif, renvoie (nombre d'éléments à retirer, remplacement). Le
+flux est reconstruit instruction par instruction, ce qui permet aux règles de
+s'enchaîner (push 1; push 2; add; push 3; mul -> push 9), puis on repasse
+jusqu'à ce que plus rien ne change. Les étiquettes servent de barrières : une
+règle ne fusionne jamais deux instructions séparées par une étiquette.
+
+Toute règle doit raccourcir le flux, ce qui garantit la terminaison.
+"""
+from emetteur import (
+    OP_LABEL, OP_DROP, OP_DUP, OP_PUSH, OP_GET, OP_SET,
+    OP_ADD, OP_SUB, OP_MUL, OP_DIV, OP_MOD, OP_NOT, OP_AND, OP_OR,
+    OP_CMPEQ, OP_CMPNE, OP_CMPLT, OP_CMPLE, OP_CMPGT, OP_CMPGE,
+    OP_JUMP, OP_JUMPT, OP_JUMPF, OP_RET, OP_HALT,
+)
+from machine import wrap32, c_div, c_mod
+
+
+# Opérateurs binaires évaluables à la compilation (sémantique de msm.c)
+CONST_BINOPS = {
+    OP_ADD:   lambda a, b: wrap32(a + b),
+    OP_SUB:   lambda a, b: wrap32(a - b),
+    OP_MUL:   lambda a, b: wrap32(a * b),
+    OP_DIV:   c_div,
+    OP_MOD:   c_mod,
+    OP_AND:   lambda a, b: int(bool(a) and bool(b)),
+    OP_OR:    lambda a, b: int(bool(a) or bool(b)),
+    OP_CMPEQ: lambda a, b: int(a == b),
+    OP_CMPNE: lambda a, b: int(a != b),
+    OP_CMPLT: lambda a, b: int(a < b),
+    OP_CMPLE: lambda a, b: int(a <= b),
+    OP_CMPGT: lambda a, b: int(a > b),
+    OP_CMPGE: lambda a, b: int(a >= b),
+}
+
+# Instructions après lesquelles on ne revient jamais
+UNCONDITIONAL = (OP_JUMP, OP_RET, OP_HALT)
+
+
+def rule_dup_set_drop(out):
+    """dup; set N; drop 1  ->  set N"""
+    if (len(out) >= 3 and out[-1] == (OP_DROP, 1)
+            and out[-2][0] == OP_SET and out[-3][0] == OP_DUP):
+        return 3, [out[-2]]
+    return None
+
+
+def rule_push_drop(out):
+    """push/get/dup; drop N  ->  drop N-1"""
+    if len(out) >= 2 and out[-1][0] == OP_DROP and out[-2][0] in (OP_PUSH, OP_GET, OP_DUP):
+        n = out[-1][1] - 1
+        return 2, [(OP_DROP, n)] if n > 0 else []
+    return None
+
+
+def rule_drop_merge(out):
+    """drop A; drop B  ->  drop A+B  (et drop 0 disparaît)"""
+    if out and out[-1] == (OP_DROP, 0):
+        return 1, []
+    if len(out) >= 2 and out[-1][0] == OP_DROP and out[-2][0] == OP_DROP:
+        return 2, [(OP_DROP, out[-2][1] + out[-1][1])]
+    return None
+
+
+def rule_const_fold(out):
+    """push A; push B; op  ->  push (A op B)   et   push A; not  ->  push !A"""
+    if len(out) >= 2 and out[-1][0] == OP_NOT and out[-2][0] == OP_PUSH:
+        return 2, [(OP_PUSH, int(not out[-2][1]))]
+    if (len(out) >= 3 and out[-1][0] in CONST_BINOPS
+            and out[-2][0] == OP_PUSH and out[-3][0] == OP_PUSH):
+        try:
+            value = CONST_BINOPS[out[-1][0]](out[-3][1], out[-2][1])
+        except ArithmeticError:
+            return None   # laissé tel quel : l'erreur doit rester à l'exécution
+        return 3, [(OP_PUSH, value)]
+    return None
+
+
+def rule_identity(out):
+    """push 0; add|sub  et  push 1; mul|div  ->  rien"""
+    if len(out) >= 2 and out[-2][0] == OP_PUSH:
+        op, value = out[-1][0], out[-2][1]
+        if (value == 0 and op in (OP_ADD, OP_SUB)) or (value == 1 and op in (OP_MUL, OP_DIV)):
+            return 2, []
+    return None
+
+
+def rule_const_branch(out):
+    """push C; jumpf/jumpt L  ->  jump L  ou rien"""
+    if len(out) >= 2 and out[-1][0] in (OP_JUMPF, OP_JUMPT) and out[-2][0] == OP_PUSH:
+        taken = bool(out[-2][1]) == (out[-1][0] == OP_JUMPT)
+        return 2, [(OP_JUMP, out[-1][1])] if taken else []
+    return None
+
+
+def rule_not_branch(out):
+    """not; jumpf L  ->  jumpt L   (et inversement)"""
+    if len(out) >= 2 and out[-1][0] in (OP_JUMPF, OP_JUMPT) and out[-2][0] == OP_NOT:
+        flipped = OP_JUMPT if out[-1][0] == OP_JUMPF else OP_JUMPF
+        return 2, [(flipped, out[-1][1])]
+    return None
+
+
+def rule_unreachable(out):
+    """jump/ret/halt; X  ->  jump/ret/halt   (X sans étiquette devant)"""
+    if len(out) >= 2 and out[-1][0] != OP_LABEL and out[-2][0] in UNCONDITIONAL:
+        return 1, []
+    return None
+
+
+def rule_jump_to_next(out):
+    """jump L; .A; .L  ->  .A; .L   (saut vers l'étiquette qui suit)"""
+    if not out or out[-1][0] != OP_LABEL:
+        return None
+    i = len(out) - 1
+    targets = set()
+    while i >= 0 and out[i][0] == OP_LABEL:
+        targets.add(out[i][1])
+        i -= 1
+    if i >= 0 and out[i][0] == OP_JUMP and out[i][1] in targets:
+        n = len(out) - i
+        return n, out[i + 1:]
+    return None
+
+
+# Table des règles, dans l'ordre où elles sont essayées
+PEEPHOLE_RULES = [
+    ("dup_set_drop", rule_dup_set_drop),
+    ("const_fold", rule_const_fold),
+    ("identity", rule_identity),
+    ("const_branch", rule_const_branch),
+    ("not_branch", rule_not_branch),
+    ("push_drop", rule_push_drop),
+    ("drop_merge", rule_drop_merge),
+    ("unreachable", rule_unreachable),
+    ("jump_to_next", rule_jump_to_next),
+]
+
+
+def _real_count(instructions):
+    return sum(1 for op, _ in instructions if op != OP_LABEL)
+
+
+def optimize(instructions, rules=None):
+    """Applique les règles jusqu'à point fixe
+
+    Args:
+        instructions: liste (opcode, opérande)
+        rules: noms des règles à activer (toutes par défaut)
+
+    Returns:
+        (instructions optimisées, {règle: nombre d'instructions retirées})
+    """
+    if rules is None:
+        table = PEEPHOLE_RULES
+    else:
+        known = dict(PEEPHOLE_RULES)
+        unknown = [name for name in rules if name not in known]
+        if unknown:
+            raise ValueError(f"Unknown peephole rule(s): {', '.join(unknown)}")
+        table = [(name, rule) for name, rule in PEEPHOLE_RULES if name in rules]
+
+    report = {name: 0 for name, _ in table}
+    code = list(instructions)
+    changed = True
+    while changed:
+        changed = False
+        out = []
+        for ins in code:
+            out.append(ins)
+            matched = True
+            while matched:
+                matched = False
+                for name, rule in table:
+                    m = rule(out)
+                    if m is not None:
+                        n, replacement = m
+                        report[name] += _real_count(out[-n:]) - _real_count(replacement)
+                        del out[-n:]
+                        out.extend(replacement)
+                        changed = matched = True
+                        break
+        code = out
+    return code, report
+
+
+if __name__ == "__main__":
+    from emetteur import parse_instructions, format_instructions
+
+    source = """
+.start
+resn 1
+push 2
+push 3
+mul
+push 1
+add
+dup
+set 0
+drop 1
+get 0
+push 0
+jumpf L0
+jump L1
+.L0
+.L1
+get 0
+ret
+ret
+halt
+.end
+"""
+    code, report = optimize(parse_instructions(source))
+    print(format_instructions(code), end="")
+    print(report)